@@ -4,11 +4,145 @@ Author: asad70
 -------------------------------------------------------------------
 ****************************************************************************'''
 
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 from openpyxl import load_workbook
 import pprint 
 import pickle
+import sys
+import io
+import csv
+import json
+import itertools
+import re
+import heapq
+import bisect
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Mapping
+import threading
+import struct
+import zlib
+import bz2
+import lzma
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import urllib.parse
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import hashlib
+import tempfile
+import html
+import os
+
+try:
+    import readline         # tab completion of the names, not on Windows
+except ImportError:
+    readline = None
+
+
+# Output formats understood by render(), 'text' is the original layout.
+OUTPUT_FORMATS = ('text', 'csv', 'jsonl', 'table')
+
+# Settings changed from the menu, used as defaults by the printing functions.
+SETTINGS = {'format': 'text', 'scale': 'count', 'variants': False}
+
+# Scales of the frequencies: the number of babies or babies per 1,000 births
+# of the same year and gender, and the label of the charts' axis.
+SCALES = ('count', 'rate')
+SCALE_LABELS = {'count': 'Frequency of Name', 
+                'rate': 'Babies per 1,000 births'}
+
+TREND_COLUMNS = ['name', 'year', 'boys', 'girls']
+TOP_TEN_COLUMNS = ['year', 'rank', 'name', 'frequency', 'gender']
+
+# Snapshot files (.snap) start and end with this, see save_snapshot.
+SNAPSHOT_MAGIC = b"ABNSNAP1"
+SNAPSHOT_CODECS = {'zlib': (zlib.compress, zlib.decompress),
+                   'bz2': (bz2.compress, bz2.decompress),
+                   'lzma': (lzma.compress, lzma.decompress)}
+# Errors of a missing, truncated or corrupt snapshot: the file itself, the 
+# codecs (bz2 raises OSError or ValueError) and the pickled blocks.
+SNAPSHOT_ERRORS = (OSError, ValueError, EOFError, KeyError, struct.error, 
+                   zlib.error, lzma.LZMAError, pickle.UnpicklingError)
+
+# Gender codes of the compact records, the code is the index.
+GENDERS = ('Boy', 'Girl')
+
+# Keys of the compact records holding the data itself, the other keys are 
+# indexes and caches (see build_records and memory_report).
+RECORD_LAYER = ('names', 'ids', 'name', 'gender', 'year', 'count', 'offsets')
+
+# Number of names suggested by the name completion, and the largest number 
+# of names under a prefix ranked when asked instead of stored.
+COMPLETIONS = 10
+COMPLETION_SCAN = 64
+
+# Folder and largest size of the cache of the rendered charts.
+CHART_CACHE = {'dir': os.path.join(os.path.expanduser("~"), ".cache", 
+                                   "albertanames", "charts"), 
+               'max_bytes': 64 * 1024 * 1024}
+
+# matplotlib styles change the global rcParams, so charts are drawn one at a
+# time (the HTTP server of serve_completions answers in threads).
+CHART_LOCK = threading.Lock()
+
+# Results of the queries, see cached_query. The lock is needed because 
+# the HTTP server of serve_completions answers in threads.
+QUERY_CACHE = {'entries': OrderedDict(), 'max_size': 256, 'hits': 0, 
+               'misses': 0}
+QUERY_LOCK = threading.Lock()
+
+# Pool of processes of fan_out and the shards it was started with (in the 
+# workers, 'shards' holds the shards themselves), see shard_pool.
+SHARD_POOL = {'key': None, 'pool': None, 'shards': None}
+
+# Columns of the exported records and number of rows made per write.
+EXPORT_COLUMNS = ['name', 'gender', 'year', 'frequency', 'rank']
+EXPORT_CHUNK = 10000
+
+# Forecast methods (see forecast_counts), number of trailing years used, 
+# smoothing factor and number of past years scored by the backtest.
+FORECAST_METHODS = ('smoothing', 'trend')
+FORECAST_WINDOW = 5
+FORECAST_ALPHA = 0.5
+FORECAST_HOLDOUT = 5
+
+# Soundex digit of the consonants, see phonetic_key. Spellings of the same 
+# name may differ by 1 edit from 4 letters and by 2 from 8 letters.
+SOUNDEX_CODES = {char: str(digit) for digit, chars in 
+                 enumerate(('bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r'), 1) 
+                 for char in chars}
+VARIANT_LIMITS = ((4, 1), (8, 2))
+
+# Default number of archetypes of the names, the fewest babies a name 
+# needs to be clustered (see name_archetypes) and the number of names given 
+# their archetype at once at the end of mini_batch_kmeans.
+ARCHETYPES = 6
+ARCHETYPE_MIN = 50
+ARCHETYPE_CHUNK = 8192
+
+# Content types of the chart formats.
+CHART_TYPES = {'png': "image/png", 'svg': "image/svg+xml"}
+
+# Changed when the layout of the report pages changes, so they are rebuilt.
+REPORT_VERSION = 2
+
+# Columns of the diversity of the names of each year and gender.
+DIVERSITY_COLUMNS = ['year', 'gender', 'names', 'births', 'entropy', 'gini', 
+                     'top 10 %', 'top 100 %']
+
+# Orders of the wildcard results and the number of names printed per page.
+WILDCARD_ORDERS = ('frequency', 'peak', 'name', 'none')
+PAGE_SIZE = 20
+
+# Sort keys of the ranked wildcard orders, given the names dictionary.
+WILDCARD_KEYS = {
+    'frequency': lambda names: lambda name: name_total(names[name]),
+    'peak': lambda names: lambda name: name_peak(names[name]),
+    'name': lambda names: lambda name: name,
+}
 
 
 def open_file(fName):
@@ -194,7 +328,8 @@ def pickle_helper(data):
     without entering a file name, it uses the default (which is be 
     baby_names.p).
     This function calls pickle_dicts(fName, names, top_ten, max_year) to save 
-    the data.
+    the data, or save_snapshot(fName, names, top_ten, max_year) when the 
+    filename ends with ".snap".
     
     Parameters:
         data: tuple
@@ -212,6 +347,15 @@ def pickle_helper(data):
         
     wk_bk = input("Enter a file name [baby_names.p]: ")    
     
+    if len(wk_bk) > 0 and wk_bk.strip()[-5:] == ".snap":
+        wk_bk = wk_bk.strip()
+        try:
+            size = save_snapshot(wk_bk, names, top_ten, max_year)
+        except OSError:
+            print("Could not save snapshot in " + wk_bk + ".")
+            return
+        print("Saved snapshot in " + wk_bk + " (" + str(size) + " bytes).")
+        return
     if len(wk_bk) > 0 and wk_bk.strip()[-2:] == ".p":
         wk_bk = wk_bk    
     else:
@@ -246,7 +390,8 @@ def pickle_dicts(fName, names, top_ten, max_year):
     except:
         wb_loaded = open("baby_names.p", "wb")
         
-    data = (names, top_ten, max_year)
+    # The compact records are saved as the plain names dictionary.
+    data = (dict(names), top_ten, max_year)
     pickle.dump(data, wb_loaded)
     wb_loaded.close() 
     print("Saved pickled data in " + fName + ".")
@@ -257,7 +402,8 @@ def load_helper():
     If the user enters a filename, this function calls load_pickle(fName) to 
     open the file otherwise the default filename is used. If the user presses 
     enter without entering a file name, it uses the default (which is 
-    baby_names.p). This function returns a tuple containing the dictionaries 
+    baby_names.p). Files ending with ".snap" are read by load_snapshot(fName).
+    This function returns a tuple containing the dictionaries 
     for the names, the top ten lists, and the latest year.
 
     Parameters:
@@ -279,7 +425,10 @@ def load_helper():
         wk_bk = wk_bk    
     
     try:
-        names, top_ten, max_year = load_pickle(wk_bk)
+        if wk_bk.strip()[-5:] == ".snap":
+            names, top_ten, max_year = load_snapshot(wk_bk.strip())
+        else:
+            names, top_ten, max_year = load_pickle(wk_bk)
     except: return
     
     return names, top_ten, max_year
@@ -318,726 +467,3964 @@ def load_pickle(fName):
     return (names, top_ten, max_year)
     
 
-def search_helper(full_list, search):
+def name_letter(name):
     '''
-    Expects the dictionary of all names in which data sorted is with separate 
-    years, each year containning the gender and frequency and the name to be 
-    searched as parameters. This function prints out the frequencies of boys a
-    and girls who were given that name in each year. If there were no babies 
-    given the searched for name, a message is displayed that no babies were 
-    given this name (capitalized).
+    Returns the partition of a name in a snapshot, the first letter of its 
+    normalize_key ('_' when it has none).
+    '''
+    key = normalize_key(name)
+    return key[0] if len(key) > 0 else "_"
+
+def save_snapshot(fName, names, top_ten, max_year, codec = 'zlib'):
+    '''
+    Saves the data as a snapshot split into partitions, each one compressed
+    on its own so a query only reads and decompresses what it needs. The 
+    rows are split by year and by the initial letter of the name (see 
+    name_letter), one block per year and letter, so a year is in the blocks 
+    of its row of the grid and a name in the blocks of its letter. The top 
+    ten list of every year is a small block of its own.
+    A block keeps its rows by column: the names joined by new lines, one 
+    byte per gender code and four bytes per frequency, which compresses much
+    better than the lists of the names dictionary.
+    Layout of the file:
+        SNAPSHOT_MAGIC, the blocks, the index (JSON with the codec, the 
+        latest year, the offset and length of every block and the hash of 
+        every year, see year_blocks), the length of the index (8 bytes) and
+        SNAPSHOT_MAGIC again.
     
     Parameters:
-        full_list: dictionary
-               dictionary of all names, data sorted with separate years.
-        search: str
-              name to be searched
-    
-    Return: NONE
-    '''    
-    # Dictionary sorted to prvent error while adding years in previous func.
-    yr_dict = full_list[search]
-    yr_dict = dict(sorted(yr_dict.items()))
+        fName: Name of the file
+        names: names dictionary
+        top_ten:  dictionary of top ten lists
+        max_year: latest year 
+        codec: str
+              'zlib', 'bz2' or 'lzma'
     
-    print("\n" + search + ":")
-    print("\tBoys\tGirls")
-    # for name in the full_list, that has the following data (as ex.)
-    # {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
-    for list_name in full_list:
-        if list_name == search:     # If the name is same as being searched
-            # Acessing years in the keys.
-            for years in (yr_dict.keys()):  
-                # Try/except used to prevent 'index out of range error'
-                try:
-                    # Case where name is given to only boys.
-                    # If Boy in {'Michael':{1980: [['Boy', 732], ['Girl', 705]]
-                    if  'Boy' in yr_dict[years][0]: 
-                        # if length of {1980: [['Boy', 732], ['Girl', 705]]} =1
-                        if len(yr_dict[years]) == 1:
-                            print(years, "\t", end = "")
-                            print(yr_dict[years][0][1], end = "")                                  
-                            print("\t", "0")
-                                    
-                    # Case where name is only given to girl
-                    # Ex: full_list[search][years][0] = ['Boy', 732]
-                    if 'Girl' in yr_dict[years][0]:
-                        if len(yr_dict[years]) == 1:
-                            print(years, "\t", "0", end = "")
-                            print("\t", yr_dict[years][0][1])    
-                        
-                    # Case where name is given to both boys and girls
-                    if 'Boy' in yr_dict[years][0] and \
-                    'Girl' in yr_dict[years][1]:
-                        print(years, "\t", end = "")
-                        print(yr_dict[years][0][1], end = "")
-                        print("\t" , yr_dict[years][1][1])                     
-                except: pass    
-                
-def name_search(names, year):
+    Return: int, size of the file in bytes
     '''
-    Expects the dictionary of all names, the latest year as parameters. This
-    function asks the user for a name and calls name_trend(names, year) and 
-    search_helper(full_list, search) to print out the frequencies of boys and girls 
-    who were given that name in each year. If there were no babies given the 
-    searched for name, a message is displayed that no babies were given this 
-    name (capitalized).
+    compress = SNAPSHOT_CODECS[codec][0]
+    records = get_records(names)
+    index = {'codec': codec, 'max_year': max_year, 'top_ten': {}, 
+             'blocks': {}, 'hashes': {str(year): block[0] for year, block in
+                                      year_blocks(records).items()}}
     
-    Parameters:
-        names: dictionary
-               dictionary of all names
-        year: int
-              latest year
+    # Letter of every row, then the rows sorted by year, letter and name.
+    letters = sorted(set(name_letter(name) for name in records['names']))
+    letter_codes = np.array([letters.index(name_letter(name)) 
+                             for name in records['names']], dtype = np.int64)
+    row_letter = letter_codes[records['name']] if len(letters) else \
+                 np.zeros(0, dtype = np.int64)
+    order = np.lexsort((records['name'], row_letter, records['year']))
+    year, letter = records['year'][order], row_letter[order]
+    bounds = np.flatnonzero((year[1:] != year[:-1]) | 
+                            (letter[1:] != letter[:-1])) + 1
     
-    Return: NONE
+    with open(fName, "wb") as snap_file:
+        snap_file.write(SNAPSHOT_MAGIC)
+        
+        def write_block(payload):
+            data = compress(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL))
+            offset = snap_file.tell()
+            snap_file.write(data)
+            return [offset, len(data)]
+        
+        for year_key in sorted(top_ten):
+            index['top_ten'][str(year_key)] = write_block(top_ten[year_key])
+        
+        for rows in np.split(order, bounds):
+            if len(rows) == 0:
+                continue
+            key = (str(records['year'][rows[0]]) + "/" + 
+                   letters[row_letter[rows[0]]])
+            payload = {'names': "\n".join(records['names'][i] for i in 
+                                          records['name'][rows].tolist()),
+                       'gender': records['gender'][rows].tobytes(),
+                       'count': records['count'][rows].astype('<u4')
+                                .tobytes()}
+            index['blocks'][key] = write_block(payload)
+        
+        footer = json.dumps(index).encode('utf-8')
+        snap_file.write(footer)
+        snap_file.write(struct.pack("<Q", len(footer)))
+        snap_file.write(SNAPSHOT_MAGIC)
+        return snap_file.tell()
+
+def read_snapshot_index(fName):
     '''
-    if len(names.keys()) == 0:
-        print("There are no data")
-        return
+    Reads the index at the end of a snapshot made by save_snapshot, without 
+    reading the blocks.
     
-    search = input("Enter a name: ")
-    search = search.capitalize()
-    if search not in names.keys():
-        print("There were no babies named " + search + " born in Alberta" 
-              " between 1980 and " + str(year))
-        return
-            
-    full_list = name_trend(names, year)
+    Parameters:
+        fName: Name of the file
     
-    # Passing the data to search helper for rest of the work.
-    search_helper(full_list, search)   
+    Return: dictionary with the keys 'codec', 'max_year', 'top_ten' (year to
+            [offset, length]), 'blocks' ((year, letter) to [offset, length])
+            and 'hashes' (year to hash, empty in older snapshots)
+    '''
+    size = len(SNAPSHOT_MAGIC)
+    with open(fName, "rb") as snap_file:
+        if snap_file.read(size) != SNAPSHOT_MAGIC:
+            raise ValueError(fName + " is not a snapshot")
+        snap_file.seek(-(8 + size), os.SEEK_END)
+        length = struct.unpack("<Q", snap_file.read(8))[0]
+        if snap_file.read(size) != SNAPSHOT_MAGIC:
+            raise ValueError(fName + " is not a complete snapshot")
+        snap_file.seek(-(8 + size + length), os.SEEK_END)
+        index = json.loads(snap_file.read(length).decode('utf-8'))
+    index['top_ten'] = {int(year): block 
+                        for year, block in index['top_ten'].items()}
+    blocks = {}
+    for key, block in index['blocks'].items():
+        year, letter = key.split("/", 1)
+        blocks[(int(year), letter)] = block
+    index['blocks'] = blocks
+    index['hashes'] = {int(year): digest 
+                       for year, digest in index.get('hashes', {}).items()}
+    return index
+
+def read_snapshot_block(fName, index, block):
+    '''
+    Reads and decompresses one block of a snapshot.
     
+    Parameters:
+        fName: Name of the file
+        index: dictionary from read_snapshot_index(fName)
+        block: [offset, length] from the index
     
-def name_trend(names, year):
+    Return: the payload of the block
     '''
-    Expects the dictionary of all names, the latest year as parameters. This
-    function takes the dict and turn it into a dictionary of dictionary that has
-    name as key with dict -year as key that has list of list of boys/girls freq.
-    # Ex: {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
+    decompress = SNAPSHOT_CODECS[index['codec']][1]
+    with open(fName, "rb") as snap_file:
+        snap_file.seek(block[0])
+        return pickle.loads(decompress(snap_file.read(block[1])))
+
+def snapshot_rows(fName, index, keys):
+    '''
+    Reads the row blocks of the keys and yields their rows as 
+    (name, frequency, gender, year).
+    '''
+    for year, letter in keys:
+        payload = read_snapshot_block(fName, index, 
+                                      index['blocks'][(year, letter)])
+        counts = np.frombuffer(payload['count'], dtype = '<u4').tolist()
+        for name, gender, freq in zip(payload['names'].split("\n"), 
+                                      payload['gender'], counts):
+            yield name, freq, GENDERS[gender], year
+
+def snapshot_year(fName, year, index = None):
+    '''
+    Returns the data of one year from a snapshot, only the blocks of that 
+    year are read.
     
     Parameters:
-        names: dictionary
-               dictionary of all names
+        fName: Name of the file
         year: int
-              latest year
+        index: dictionary from read_snapshot_index(fName), read if missing
     
-    Return: full_list: dictionary of dict, with names as key and dict with year
-                as key and boys/girls names with frequency as lists of lists.
-                # Ex: {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
-    '''    
-    full_list = {}                  # New dictionary
-    for keys in names:              # keys refer to name in dictionary.
-        full_list[keys] = {}        # add [key]-name dictionary to full-list 
-        for name in names[keys]:     # name is the list data for single name.
-            year = name[-1]
-            # if year has not been added, then add.
-            if year not in full_list[keys].keys():
-                full_list[keys][year] = []
-            else: pass
-            gender = name[1]
-            freq = name[0]
-            # Ex: {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
-            full_list[keys][year].append([gender, freq])
-    
-    return full_list 
-
+    Return: dictionary with the keys 'top_ten' (list of [rank, name, 
+            frequency, gender]) and 'rows' (list of [name, frequency, 
+            gender]), NONE if the year is not in the snapshot
+    '''
+    if index is None:
+        index = read_snapshot_index(fName)
+    keys = sorted(key for key in index['blocks'] if key[0] == year)
+    if len(keys) == 0 and year not in index['top_ten']:
+        return
+    top = []
+    if year in index['top_ten']:
+        top = read_snapshot_block(fName, index, index['top_ten'][year])
+    return {'top_ten': top, 
+            'rows': [[name, freq, gender] for name, freq, gender, _ in 
+                     snapshot_rows(fName, index, keys)]}
 
-def open_file(fName):
+def load_snapshot(fName):
     '''
-    Expects the filename string (including ".xlsx" suffix) of a Excel .xlsx 
-    file, structured as follows:
-    1	    Michael	   732	           Boy	        1980
-    2	    Christopher	   633	           Boy	        1980 <--Start At line 7
-    :       :              :               :             :
-    2,175   Eloise         1               Girl         2018
-    
-    extracts the data, starting at row 7, find the latest year in the data. 
-    Then return the raw data in the form of a list of lists where each list is
-    a row of data from the Excel, i.e. [rank, name, frequency, gender, year]. 
-    The latest year in the data must be an integer. The first 6 rows must not 
-    be included.The raw data list of lists and the latest year are
-    returned.
+    Reads a whole snapshot made by save_snapshot. In case of failure to open
+    the file or a corrupt block this returns NONE.
     
-     Parameters:
+    Parameters:
         fName: Name of the file
-    Return:
-        data: list 
-              data is in the form of a list of lists where each list is
-    a row of data from the Excel, i.e. [rank, name, frequency, gender, year]. 
-        max_year: int
-                 latest year in the data
-    '''
     
+    Return: tuple (names, top_ten, max_year) like load_pickle
+    '''
     try:
-        wk_bk = load_workbook(fName, data_only = True)
-    except:
-        print("File does not exist")
+        index = read_snapshot_index(fName)
+        top_ten = {year: read_snapshot_block(fName, index, block) 
+                   for year, block in sorted(index['top_ten'].items())}
+        names = {}
+        for name, freq, gender, year in snapshot_rows(
+                fName, index, sorted(index['blocks'])):
+            if name in names:
+                names[name].append([freq, gender, year])
+            else:
+                names[name] = [[freq, gender, year]]
+    except SNAPSHOT_ERRORS:
+        print("Could not load snapshot from " + fName + ".")
         return
-      
-    
-    sheet = wk_bk.active
-    row_max, col_max = sheet.max_row, sheet.max_column  
-    
-    col_max_letter = chr(ord('A') + sheet.max_column - 1)   # Last column: 'E'
-    col_last = chr(ord('A') + sheet.max_column - 1)  
-    cell_last = col_last + str(row_max)
-    max_cell = col_max_letter + str(sheet.max_row)
     
-    data = [ ]
-    rows = sheet['A7': cell_last]       # To be returned, skips first 6 lines
+    print("Loaded snapshot from " + fName + ".")
+    return names, top_ten, index['max_year']
+
+def build_records(names):
+    '''
+    Expects the dictionary of names and packs it into arrays, one element per
+    row of the names dictionary, instead of one python list per row:
+        name:   uint32 id of the name in the 'names' list (interned strings)
+        gender: uint8 code, the index in GENDERS (0 = 'Boy', 1 = 'Girl')
+        year:   uint16
+        count:  uint32 frequency
+    Rows of the same name are next to each other, the rows of name id i are 
+    offsets[i] to offsets[i + 1].
     
-    # Go thru the rows, put all of the row data in alist and append that
-    # list to 
-    for row in rows:                    # Iterate vertically over rows
-        row_data = [ ]                  # New list for row
-        for cell in row:                # Iterate over every element in a row
-            if isinstance(cell.value, str) and cell.value[0] == '=':
-                row_data.append(data[len(data)-1][0])                
-            else:            
-                row_data.append(cell.value)
-        row_data[-1] = str(row_data[-1])
-        data.append(row_data)           # Add it to final list
-        		
-    max_year = data[-1][-1]
-     
-    return data, int(max_year)
+    Parameters:
+        names: dictionary
+               dictionary of all names
     
+    Return: records: dictionary with the keys
+        'names': list of str, 'ids': dictionary name to id, 
+        'name', 'gender', 'year', 'count', 'offsets': numpy arrays
+        'keys': normalized name index, see build_name_index(name_list)
+        'completions': prefix index, see build_completion_index(records)
+        'births', 'births_start': totals per year and gender, see 
+                   birth_totals(records)
+    '''
+    name_list = [sys.intern(name) for name in names]
+    sizes = np.fromiter((len(names[name]) for name in name_list), 
+                        dtype = np.int64, count = len(name_list))
+    offsets = np.zeros(len(name_list) + 1, dtype = np.int64)
+    np.cumsum(sizes, out = offsets[1:])
+    rows = int(offsets[-1])
     
-def create_names_dict(data, names):    
+    flat = [entry for name in name_list for entry in names[name]]
+    codes = {gender: code for code, gender in enumerate(GENDERS)}
+    records = {
+        'names': name_list,
+        'ids': {name: i for i, name in enumerate(name_list)},
+        'name': np.repeat(np.arange(len(name_list), dtype = np.uint32), 
+                          sizes),
+        'gender': np.fromiter((codes[entry[1]] for entry in flat), 
+                              dtype = np.uint8, count = rows),
+        'year': np.fromiter((entry[2] for entry in flat), dtype = np.uint16, 
+                            count = rows),
+        'count': np.fromiter((entry[0] for entry in flat), dtype = np.uint32,
+                             count = rows),
+        'offsets': offsets,
+        'keys': build_name_index(name_list),
+        }
+    records['completions'] = build_completion_index(records)
+    records['births'], records['births_start'] = birth_totals(records)
+    return records
+
+def birth_totals(records):
     '''
-    Expects the raw data extracted from the Excel file in open_file and an 
-    empty dictionary as parameters. This function processes the raw data and 
-    returns the dictionary using names as keys and a list of lists each 
-    containing frequency, gender, and year as the value. This dictionary is 
-    returned. 
-    For example:
-    {..., 'Kelly': [[69,'Boy',1980], 
-                   [61, 'Boy', 1981], 
-                   [53, 'Boy', 1982],
-                   [37, 'Boy', 1983], 
-                   [32, 'Boy', 1984], 
-                   [123, 'Girl', 1980], ...}
+    Adds up the frequencies of every year and gender, i.e. the number of 
+    babies of the names in the data. Made once when the data is loaded (see 
+    build_records) so the rates per 1,000 births never need another pass.
+    
     Parameters:
-        data: raw data
-        names: empty dictionary
+        records: dictionary
+               see build_records(names)
     
-    Return:
-        names: dictionary 
-               containing names as keys and a list of lists  each 
-        containing frequency, gender, and year as the value.
+    Return: tuple (totals, start)
+        totals: numpy array of float (gender, year), columns are the years 
+                from start to the latest year
+        start: int, first year of the data (0 when there are no data)
+    '''
+    if len(records['year']) == 0:
+        return np.zeros((len(GENDERS), 0)), 0
+    start = int(records['year'].min())
+    n_years = int(records['year'].max()) - start + 1
+    flat = (records['gender'].astype(np.int64) * n_years + 
+            records['year'].astype(np.int64) - start)
+    totals = np.bincount(flat, weights = records['count'], 
+                         minlength = len(GENDERS) * n_years)
+    return totals.reshape(len(GENDERS), n_years), start
+
+def per_thousand(records, counts, genders, years):
     '''
+    Turns frequencies into babies per 1,000 births of the same year and 
+    gender, for whole arrays at once. Years outside the data give 0.
     
-    # Coverts year to int from str.
-    count = 0
-    for i in data:
-        data[count][-1] = int(data[count][-1])
-        count += 1
+    Parameters:
+        records: dictionary
+               see build_records(names)
+        counts: numpy array (or list) of frequencies
+        genders: gender code (index in GENDERS) of each frequency, or 'both'
+                 for boys and girls added together
+        years: year of each frequency
     
-    for i in range(len(data)):
-        name = data[i][1]        
-        # If name isn't in names, add that to dict as key value
-        if name not in names.keys():
-            names[name] = []          
-            names[name] = [data[i][2:]] # [data[i][2:]] = frequency, gender, yr
-        else:
-            names[name].append(data[i][2:]) # [32, 'Boy', 1984]
-    return names
+    Return: numpy array of float rounded to 3 decimals
+    '''
+    totals, start = records['births'], records['births_start']
+    if isinstance(genders, str):
+        totals, genders = totals.sum(axis = 0, keepdims = True), 0
+    counts = np.asarray(counts, dtype = np.float64)
+    col = np.asarray(years, dtype = np.int64) - start
+    inside = (col >= 0) & (col < totals.shape[1])
+    if totals.shape[1] == 0:
+        return np.zeros(counts.shape)
+    births = np.where(inside, totals[genders, np.where(inside, col, 0)], 0)
+    rates = np.divide(counts * 1000, births, out = np.zeros(births.shape), 
+                      where = births > 0)
+    return np.round(rates, 3)
 
-def create_top_ten_dict(data, names):
+def trend_rates(records, rows):
     '''
-    Expects raw data extracted from the Excel file in open_file and an empty 
-    dictionary as parameters. This function processes the raw data and returns 
-    the dictionary using years as keys and a list of lists each containing 
-    rank, name, gender, and year as the value. For example:
-    {1980: [[1, 'Michael', 732, 'Boy'], [2, 'Christopher', 633, 'Boy'], 
-    [3, 'David', 537, 'Boy']...}
+    Returns the rows [name, year, boys, girls] of the search with the boys 
+    and girls as babies per 1,000 births (see per_thousand).
+    '''
+    rows = list(rows)
+    if len(rows) == 0:
+        return rows
+    labels, years, boys, girls = zip(*rows)
+    boys = per_thousand(records, boys, 0, years).tolist()
+    girls = per_thousand(records, girls, 1, years).tolist()
+    return [list(row) for row in zip(labels, years, boys, girls)]
+
+def top_ten_rates(records, rows):
+    '''
+    Returns the rows [year, rank, name, frequency, gender] of the top ten 
+    list with the frequency as babies per 1,000 births (see per_thousand).
+    '''
+    if len(rows) == 0:
+        return rows
+    genders = np.array([GENDERS.index(row[-1]) for row in rows])
+    rates = per_thousand(records, [row[3] for row in rows], genders, 
+                         [row[0] for row in rows]).tolist()
+    return [row[:3] + [rate] + row[4:] for row, rate in zip(rows, rates)]
+
+def scaled(records, rows, to_rates):
+    '''
+    Returns the rows in the scale of SETTINGS['scale']: unchanged for 
+    'count', to_rates(records, rows) for 'rate'. Without records (no data 
+    given by the caller) the rows are unchanged.
+    '''
+    if records is None or SETTINGS['scale'] != 'rate':
+        return rows
+    return to_rates(records, rows)
+
+class CompactNames(Mapping):
+    '''
+    Read only view of the records from build_records(names) that behaves like 
+    the names dictionary, so the existing functions keep working on it.
+    names[name] gives the same list of [frequency, gender, year] as the names 
+    dictionary but the lists are only made when a name is looked up.
+    '''
+    __slots__ = ('records',)
     
-    Parameters:
-        data: raw data
-        names: empty dictionary
+    def __init__(self, records):
+        self.records = records
+        
+    def __getitem__(self, name):
+        records = self.records
+        i = records['ids'][name]
+        start, stop = records['offsets'][i], records['offsets'][i + 1]
+        return [[freq, GENDERS[gender], year] for freq, gender, year in 
+                zip(records['count'][start:stop].tolist(), 
+                    records['gender'][start:stop].tolist(),
+                    records['year'][start:stop].tolist())]
     
-    Return:
-        names: dictionary 
-               containing years as keys and a list of lists each 
-        containing rank, name, gender, and year as the value.
+    def __contains__(self, name):
+        return name in self.records['ids']
     
-        '''
+    def __iter__(self):
+        return iter(self.records['names'])
     
-    for i in range(len(data)):
-        rank = data[i][0]
-        year = int(data[i][4])    
-        
-        if isinstance(rank, int) == True and rank < 11:
-            if year in names.keys():
-                names[year].append(data[i][:4]) #[1, 'Michael', 732, 'Boy']
-            else:
-                names[year] = []            
-                names[year] = [data[i][:4]] # rank, name, gender, and year                  
-    return names
+    def __len__(self):
+        return len(self.records['names'])
 
-def print_girl_names(g_data):
+def compact_names(names):
     '''
-    This helper function of print_top_ten expects the list of list of top ten 
-    names. This function prints out the top ten girls names in the 
-    user-specified years.
+    Expects the dictionary of names (or a CompactNames already) and returns 
+    the CompactNames view of it.
     
-    Parameters: b_data: list of list
-                        lists of list of all the girls name in given year.
-          Ex: [[1, 'Jennifer', 792, 'Girl'], [2, 'Amanda', 486, 'Girl']]
+    Parameters:
+        names: dictionary
+               dictionary of all names
+    
+    Return: CompactNames
+    '''
+    if isinstance(names, CompactNames):
+        return names
+    return CompactNames(build_records(names))
 
-                          
-    Return: NONE
+def deep_size(obj, seen = None):
     '''
-       
-    rank = {}                   # New empty dict
-    for i in g_data:            # i - is single list in boys data
-        if i[0] in rank.keys(): # i[0] is year - if year already in rank,append.
-            rank[i[0]].append([i[1], i[2]])
-        else:                   
-            rank[i[0]] = {}     # Else: add year to dict. Ex {1:}
-            rank[i[0]] = []     # Add list to that year. Ex: {1: []}
-            rank[i[0]].append([i[1], i[2]]) # Ex: {1: [['Jennifer', 792]]}
-       
-    for num in rank:            # num is key in rank from (1-10).
-        name = str(rank[num][0][0])
-        freq = str(rank[num][0][1])   
-        
-        if (len(rank[num])) == 1:  # If ranking has only one name.
-            print(str(num) + "\t" + name + ": " + freq + "\t")
-        else:
-            print(num, end = "")   # Else ranking has more than one name then:
-            for i in rank[num]:    # print each separately
-                print("\t" + str(i[0]) + ": " + str(i[1]), end = "")
-                length = len(rank[num])
-            print("\t")
-            for i in range(length - 1):    # Printing the number on empty line.
-                if (num + 1 + i) < 11:     # Ex: 6    Lisa: 264   Nicole: 264
-                    print(str(num + 1 + i) + "\t")     #     7
-                   
-        
-def print_boy_names(b_data):
+    Returns the memory used by obj and everything it refers to, in bytes. 
+    Objects shared by several containers (interned names, small ints) are 
+    counted once.
+    
+    Parameters:
+        obj: object to measure
+        seen: set of ids already counted
+    
+    Return: int
     '''
-    This helper function of print_top_ten expects the list of list of top ten 
-    names. This function prints out the top ten boys names in the 
-    user-specified years.
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
     
-    Parameters: b_data: list of list
-                        lists of list of all the boys name in given year.
-          Ex: [[1, 'Michael', 792, 'Boy'], [2, 'Christopher', 486, 'Boy']]
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + (0 if obj.flags.owndata else obj.nbytes)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple, set)):
+        for item in obj:
+            size += deep_size(item, seen)
+    elif isinstance(obj, CompactNames):
+        size += deep_size(obj.records, seen)
+    return size
 
-                          
-    Return: NONE
-    '''    
-                      
-    rank = {}                   # New empty dict
-    for i in b_data:            # i - is single list in boys data
-        if i[0] in rank.keys(): # i[0] is year - if year already in rank,append.
-            rank[i[0]].append([i[1], i[2]])
-        else:                   
-            rank[i[0]] = {}     # Else: add year to dict. Ex {1:}
-            rank[i[0]] = []     # Add list to that year. Ex: {1: []}
-            rank[i[0]].append([i[1], i[2]]) # Ex: {1: [['Jennifer', 792]]}
-       
-    for num in rank:
-        name = str(rank[num][0][0])
-        freq = str(rank[num][0][1])   
-        if (len(rank[num])) == 1:  # If ranking has only one name.
-            print(str(num) + "\t" + name + ": " + freq + "\t")
-        else:
-            print(num, end = "")   # Else ranking has more than one name then:
-            for i in rank[num]:    # print each separately
-                print("\t" + str(i[0]) + ": " + str(i[1]), end = "")
-                length = len(rank[num])
-            print("\t")
-            for i in range(length - 1):    # Printing the number on empty line.
-                if (num + 1 + i) < 11:     # Ex: 6    Lisa: 264   Nicole: 264
-                    print(str(num + 1 + i) + "\t")     #     7
-                   
-            
-def print_top_ten(names, max_year):
+def memory_report(names, fmt = None, stream = None):
     '''
-    Expects the dictionary of top ten lists and the latest year as parameters. 
-    This function calls ask the user for a year, error checks to ensure that 
-    the year is in the range from 1980 to the latest year, and calls 
-    print_girl_names(names, year) and print_boy_names(names, year)
-    prints the top ten list of names with their frequencies for that year. 
+    Expects the names (dictionary or CompactNames) and prints the memory used 
+    by the names dictionary of lists and by the compact records holding the 
+    same data (RECORD_LAYER), with the number of bytes per row. The indexes 
+    and caches kept next to the records (name index, completion index, 
+    matrix, ranks, ...) are listed on their own lines, a name shared with 
+    the records is not counted again.
     
-    Parameters:  names: dictionary
-                          dictionary of top ten lists
-                 max_year: int
-                          latest year
-                          
-    Return: NONE 
+    Parameters:
+        names: dictionary or CompactNames
+               dictionary of all names
+        fmt: str
+             output format, default is SETTINGS['format']
+        stream: file object, default is sys.stdout
+    
+    Return: NONE
     '''
-    if len(names.keys()) == 0:
+    if len(names) == 0:
         print("There are no data")
-        return    
+        return
     
-    year = input("Enter year (1980 to " + str(max_year) + "): ")
-    while True:
-        if len(year) != 0 and year.isdigit():
-            year = int(year)
-            if 1980 <= year <= max_year:
-                break
-        year = input("Enter year (1980 to " + str(max_year) + "): ")
-        
-    b_data, g_data = [], []
-    for data in names[year]: 
-        if data[-1] == 'Boy':       
-            b_data.append(data)     # b_data: have only the boys data    
-        elif data[-1] == 'Girl':
-            g_data.append(data)     # g_data: have only the girls data
-           
-    print("\nTop 10 names for baby girls given in Alberta in " + str(year) + \
-          ":")
-    print_girl_names(g_data) 
+    as_dict = dict(names) if isinstance(names, CompactNames) else names
+    records = compact_names(names).records
+    rows = len(records['count'])
     
-    print("\nTop 10 names for baby boys given in Alberta in " + str(year) \
-          + ":")       
-    print_boy_names(b_data)
+    dict_size = deep_size(as_dict)
+    seen = set()
+    compact_size = sum(deep_size(records[key], seen) for key in RECORD_LAYER)
+    report = [['dictionary of lists', dict_size, round(dict_size / rows, 1)],
+              ['compact records', compact_size, 
+               round(compact_size / rows, 1)]]
+    for key in records:
+        if key not in RECORD_LAYER:
+            size = deep_size(records[key], seen)
+            report.append(["index/cache '" + key + "'", size, 
+                           round(size / rows, 1)])
+    render(['representation', 'bytes', 'bytes per row'], report, fmt, stream)
+    print(str(rows) + " rows, compact records use " + 
+          str(round(100 * compact_size / dict_size, 1)) + "% of the memory")
     
-def wildcard_search(names):
+def year_rows(yr_dict):
     '''
-    Expects the names dictionary as a parameter. This function allows the user 
-    to enter a name with an asterisk (*) representing missing letter(s). 
-    This function is case insensitive. There are three parts to this function:
-    a) names ending with an asterisk, e.g. franc*
-    b) names starting with an asterisk, e.g. *elly
-    c) names with an asterisk not at the beginning or the end, e.g. moh*had
+    Expects dictionary with years as keys each containing list of list, with
+    each list having gender and frequency.
+    Ex: {1980: [['Boy', 256], ['Girl', 281]]}
+    This function flattens it into one row per year with the boys and girls
+    frequency side by side, zero when the name was not given to that gender.
+    Ex: [[1980, 256, 281]]
     
-    This function outsource the part of printing names to other functions,
-    if name end with an asterisk: name_end_ast(full_list, search)
-    if names starting with an asterisk: name_st_ast(full_list, search)
-    if names with an asterisk not at the beginning or the end: 
-    mid_ast(full_list, search)
+    Parameters:
+        yr_dict: dictionary
+               dictionary of all years, each conatining gender and their 
+               respective frequency.
     
-    Parameters:  names: dictionary
-                          dictionary of all the names
-                          
-    Return: NONE 
+    Return: rows: list of lists [year, boys, girls] sorted by year.
     '''
+    rows = []
+    for years in sorted(yr_dict):
+        boys, girls = 0, 0
+        for gender, freq in yr_dict[years]:
+            if gender == 'Boy':
+                boys += freq
+            elif gender == 'Girl':
+                girls += freq
+        rows.append([years, boys, girls])
+    return rows
+
+def json_default(value):
+    '''
+    Helper for json.dumps, converts numpy scalars to plain python numbers.
     
-    if len(names.keys()) == 0:
-        print("There are no data")
-        return
-    
-    search = input("Enter name with * indicating missing letters: ")
-    search = search.capitalize()
-    
-    # Turns this data {'Michael': [[732, 'Boy', 1980], [705, 'Boy', 1981]]} into
-    # the following: {'Michael': {1980: [['Boy', 732]], 1981: [['Boy', 705]]
-    full_list = {}                  # New dictionary
-    for keys in names:              # keys refer to name in dictionary.
-        full_list[keys] = {}        # add [key]-name dictionary to full-list 
-        for lis in names[keys]:     # lis is the list data for single name.
-            year = lis[-1]
-            # if year has not been added, then add.
-            if year not in full_list[keys].keys():
-                full_list[keys][year] = []
-            else: pass
-            gender = lis[1]
-            freq = lis[0]
-            # Ex: {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
-            full_list[keys][year].append([gender, freq])
-            
-    # Passing the data to search helper for printing out the names.
-    if "*" in search[-1]:
-        name_end_ast(full_list, search)
-        
-    if "*" in search[0]:
-        name_st_ast(full_list, search)
-        
-    elif not "*" in search[-1]:
-        if "*" in search:
-            mid_ast(full_list, search)
+    Parameters:
+        value: object json could not serialize
     
-def name_end_ast(full_list, search):
+    Return: python int/float equal to value
     '''
-    Expects the dictionary of all names in which data sorted is with separate 
-    years, each year containning the gender and frequency and the name to be 
-    searched as parameters. This function takes the names ending with an
-    asterisk, e.g. franc*. Searches for that name is dictionary, and pass on 
-    the results to all_print_helper(yr_dict) to print out the names.
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(repr(value) + " is not JSON serializable")
+
+def render(columns, rows, fmt = None, stream = None, layout = None):
+    '''
+    Expects the column names, the rows to be shown and optionally the output 
+    format, the stream to write to and a layout function for the text format.
+    The whole output is built in memory first and then written to the stream 
+    in a single write, instead of one print() per field.
+    Formats:
+        text:  layout(buf, rows) writes the original layout of the caller
+        csv:   header line then comma separated rows
+        jsonl: one JSON object per row
+        table: columns aligned with padding
     
     Parameters:
-        full_list: dictionary
-               dictionary of all names, data sorted with separate years.
-        search: str
-              name to be searched
+        columns: list of str
+                 column names
+        rows: iterable of lists
+              the data, one list per row in the same order as columns
+        fmt: str
+             one of OUTPUT_FORMATS, default is SETTINGS['format']
+        stream: file object, default is sys.stdout
+        layout: function(buf, rows) used for the text format
     
     Return: NONE
-    '''    
-    s = search
-    
-    search = search.replace("*", "")
-    search = search.capitalize()
-    ser_len = len(search)
-    match_names = []
+    '''
+    if fmt is None:
+        fmt = SETTINGS['format']
+    if stream is None:
+        stream = sys.stdout
+    if fmt == 'text' and layout is None:
+        fmt = 'table'
     
-    # for name in the full_list, that has the following data (as ex.)
-    # {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
-    for list_name in full_list:
-        if list_name[:ser_len] == search: # If name is same as being searched
-            match_names.append(list_name)
-            
-    if len(match_names) == 0: print("No name found using " + s); return
+    buf = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buf, lineterminator = "\n")
+        writer.writerow(columns)
+        writer.writerows(rows)
+    elif fmt == 'jsonl':
+        for row in rows:
+            buf.write(json.dumps(dict(zip(columns, row)), 
+                                 default = json_default) + "\n")
+    elif fmt == 'table':
+        rows = [list(row) for row in rows]
+        widths = [len(col) for col in columns]
+        for row in rows:
+            for i in range(len(row)):
+                widths[i] = max(widths[i], len(str(row[i])))
+        line = "  ".join(col.ljust(w) for col, w in zip(columns, widths))
+        buf.write(line.rstrip() + "\n")
+        buf.write("  ".join("-" * w for w in widths) + "\n")
+        for row in rows:
+            # Numbers are right aligned, text is left aligned.
+            line = "  ".join(str(value).rjust(w) 
+                             if isinstance(value, (int, float, np.number)) 
+                             else str(value).ljust(w) 
+                             for value, w in zip(row, widths))
+            buf.write(line.rstrip() + "\n")
+    elif fmt == 'text':
+        layout(buf, rows)
+    else:
+        raise ValueError("Unknown output format " + str(fmt))
     
-    for n in match_names:
-        yr_dict = full_list[n]
-        yr_dict = dict(sorted(yr_dict.items()))    
-        
-        print("\n\tBoys\tGirls")        
-        print(n)
-        
-        all_print_helper(yr_dict)
-        
-def all_print_helper(yr_dict):
+    stream.write(buf.getvalue())
+    stream.flush()
 
+def search_layout(buf, rows):
     '''
-    Expects dictionary with years as keys each containing list of list, with
-    each list having gender and frequency.
-    Ex: {1980: [['Boy', 256], ['Girl', 281]]}
-        {1980: [['Boy', 732]]}
-    This function takes the data, iterates to see type of it (if the name is 
-    given to only boy or only girl or both) and finally prints the data 
-    accordingly.
+    Text layout of the name search, rows are [name, year, boys, girls].
     Ex: 
     Michael:
-                Boys	Girls
-        1980 	732	 0
-        
-    This function is used in all three cases of wildcard search.
+            Boys	Girls
+    1980 	732	 0
     
     Parameters:
-        yr_dict: dictionary
-               dictionary of all years, each conatining gender and their 
-               respective frequency.
+        buf: file object to write to
+        rows: iterable of [name, year, boys, girls]
     
     Return: NONE
     '''
-    # Acessing years in the keys.
-    for years in (yr_dict.keys()):  
-        # Try/except used to prevent 'index out of range error'
-        try:
-            # Case where name is given to only boys.
-            # If Boy in {'Michael':{1980: [['Boy', 732], ['Girl', 705]]
-            if  'Boy' in yr_dict[years][0]: 
-                # if length of {1980: [['Boy', 732], ['Girl', 705]]} =1
-                if len(yr_dict[years]) == 1:
-                    print(str(years) + ":" +  "\t", end = "")
-                    print(yr_dict[years][0][1], end = "")           
-                    print("\t" + "0")
-                            
-            # Case where name is only given to girl
-            # Ex: full_list[search][years][0] = ['Boy', 732]
-            if 'Girl' in yr_dict[years][0]:
-                if len(yr_dict[years]) == 1:
-                    print(str(years) + ":" + "\t" + "0", end = "")
-                    print("\t" + str(yr_dict[years][0][1]))    
-                
-            # Case where name is given to both boys and girls
-            if 'Boy' in yr_dict[years][0] and \
-            'Girl' in yr_dict[years][1]:
-                print(str(years) + ":" +  "\t", end = "")
-                print(yr_dict[years][0][1], end = "")
-                print("\t" + str(yr_dict[years][1][1]))                     
-        except: pass            
+    for name, group in itertools.groupby(rows, key = lambda row: row[0]):
+        buf.write("\n" + str(name) + ":\n\tBoys\tGirls\n")
+        for _, years, boys, girls in group:
+            buf.write(str(years) + " \t" + str(boys) + "\t " + str(girls) + 
+                      "\n")
 
-def name_st_ast(full_list, search):
+def wildcard_layout(buf, rows):
     '''
-    Expects the dictionary of all names in which data sorted is with separate 
-    years, each year containning the gender and frequency and the name to be 
-    searched as parameters. This function takes the names starting with an
-    asterisk, e.g. *elly. Searches for that name is dictionary, and pass on 
-    the results to all_print_helper(yr_dict) to print out the names.
+    Text layout of the wildcard search, rows are [name, year, boys, girls].
+    Ex: 
+            Boys	Girls
+    Zax
+    2012:	1	0
     
     Parameters:
-        full_list: dictionary
-               dictionary of all names, data sorted with separate years.
-        search: str
-              name to be searched
+        buf: file object to write to
+        rows: iterable of [name, year, boys, girls]
     
     Return: NONE
-    '''        
-    s = search
-    search = search.replace("*", "")
-    ser_len = len(search) * (-1)
-    match_names = []
+    '''
+    for name, group in itertools.groupby(rows, key = lambda row: row[0]):
+        buf.write("\n\tBoys\tGirls\n" + str(name) + "\n")
+        for _, years, boys, girls in group:
+            buf.write(str(years) + ":\t" + str(boys) + "\t" + str(girls) + 
+                      "\n")
+
+def rank_lines(data):
+    '''
+    Expects the list of list of top ten names of one gender. Returns the text 
+    lines of the top ten list, names sharing a rank are printed on the same 
+    line followed by the skipped rank numbers on empty lines.
+    Ex: 6    Lisa: 264   Nicole: 264
+        7
     
-    # for name in the full_list, that has the following data (as ex.)
-    # {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
-    for list_name in full_list:
-        if list_name[ser_len:] == search: #If the name is same as being searched
-            match_names.append(list_name)
-            
-    if len(match_names) == 0: print("No name found using " + s); return
+    Parameters: data: list of list
+          Ex: [[1, 'Jennifer', 792, 'Girl'], [2, 'Amanda', 486, 'Girl']]
     
-    for n in match_names:
-        yr_dict = full_list[n]
-        yr_dict = dict(sorted(yr_dict.items()))    
-        
-        print("\n\tBoys\tGirls")        
-        print(n)
-        
-        all_print_helper(yr_dict)
-        
-def mid_ast(full_list, search):
+    Return: lines: list of str
+    '''
+    rank = {}                   # New empty dict
+    for i in data:              # i - is single list in the data
+        if i[0] in rank.keys(): # i[0] is rank - if rank already in dict,append.
+            rank[i[0]].append([i[1], i[2]])
+        else:                   
+            rank[i[0]] = [[i[1], i[2]]] # Ex: {1: [['Jennifer', 792]]}
+    
+    lines = []
+    for num in rank:            # num is key in rank from (1-10).
+        line = str(num)
+        for name, freq in rank[num]:  
+            line += "\t" + str(name) + ": " + str(freq)
+        lines.append(line + "\t\n")
+        for i in range(len(rank[num]) - 1): # Printing the number on empty line
+            if (num + 1 + i) < 11:          # Ex: 6    Lisa: 264   Nicole: 264
+                lines.append(str(num + 1 + i) + "\t\n")  #     7
+    return lines
+
+def top_ten_layout(buf, rows):
+    '''
+    Text layout of the top ten list, rows are [year, rank, name, frequency, 
+    gender] with the girls before the boys.
+    
+    Parameters:
+        buf: file object to write to
+        rows: iterable of [year, rank, name, frequency, gender]
+    
+    Return: NONE
+    '''
+    key = lambda row: (row[0], row[-1])
+    for (year, gender), group in itertools.groupby(rows, key = key):
+        title = "girls" if gender == 'Girl' else "boys"
+        buf.write("\nTop 10 names for baby " + title + 
+                  " given in Alberta in " + str(year) + ":\n")
+        buf.writelines(rank_lines([row[1:] for row in group]))
+
+def search_helper(full_list, search, fmt = None, stream = None, 
+                  records = None):
     '''
     Expects the dictionary of all names in which data sorted is with separate 
     years, each year containning the gender and frequency and the name to be 
-    searched as parameters. This function takes the name with asterisk not 
-    at the beginning or the end. Ex: moh*had. Searches for that name is 
-    dictionary, and pass on the results to all_print_helper(yr_dict) to print
-    out the names.
-    
+    searched as parameters. This function prints out the frequencies of boys a
+    and girls who were given that name in each year. If there were no babies 
+    given the searched for name, a message is displayed that no babies were 
+    given this name (capitalized).
+    The output is rendered in one buffered write by render().
     
     Parameters:
         full_list: dictionary
                dictionary of all names, data sorted with separate years.
         search: str
               name to be searched
+        fmt: str
+             output format, default is SETTINGS['format']
+        stream: file object, default is sys.stdout
+        records: dictionary
+              records of all names (see build_records), needed to print 
+              rates per 1,000 births when SETTINGS['scale'] is 'rate'
     
     Return: NONE
-    '''        
-    s = search    
-    sr_list = search.split("*")
-    # string part before "*", string part after "*"
-    st_str, end_str = sr_list[0], sr_list[1]
-    st_str, end_str = st_str.capitalize(), end_str.lower()
-    
-    len_st_str, len_end_str = len(st_str), len(end_str) * (-1)
-    match_names = []
-    
+    '''    
     # for name in the full_list, that has the following data (as ex.)
     # {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
-    for list_name in full_list:
-        if list_name[:len_st_str] == st_str and list_name[len_end_str:] \
-           == end_str: #If the name is same as being searched
-            match_names.append(list_name)
-            
-    if len(match_names) == 0: print("No name found using " + s); return
-    
-    for n in match_names:
-        yr_dict = full_list[n]
-        yr_dict = dict(sorted(yr_dict.items()))    
-        
-        print("\n\tBoys\tGirls")        
-        print(n)
-        
-        all_print_helper(yr_dict)
-       
-def plot(names, year):
+    rows = [[search] + row for row in year_rows(full_list[search])]
+    rows = scaled(records, rows, trend_rates)
+    render(TREND_COLUMNS, rows, fmt, stream, search_layout)
+                
+def name_search(names, year):
     '''
-    Uses the matplotlib module to implement the trend graph.
+    Expects the dictionary of all names, the latest year as parameters. This
+    function asks the user for a name, finds every spelling of it with 
+    lookup_name(names, search) and calls search_helper(full_list, search) to 
+    print out the frequencies of boys and girls who were given that name in 
+    each year. Case, accents, hyphens and spaces are ignored, so "mary ann" 
+    finds "Mary-Ann" and "Maryann" and prints their combined frequencies 
+    (with SETTINGS['variants'] also the other spellings, see 
+    variant_groups). If 
+    there were no babies given the searched for name, a message is displayed 
+    that no babies were given this name (capitalized).
     
-     Parameters:
+    Parameters:
         names: dictionary
                dictionary of all names
         year: int
               latest year
-              
-    Return:  None
-    '''    
     
+    Return: NONE
+    '''
     if len(names.keys()) == 0:
         print("There are no data")
         return
     
-    search = input("Enter a name: ")
-    search = search.capitalize()
-    if search not in names.keys():
-        print("There were no babies named " + search + " born in Alberta" 
-              " between 1980 and " + str(year))
+    search = ask_name(names)
+    spellings, name_data = lookup_name(names, search, SETTINGS['variants'])
+    if len(spellings) == 0:
+        print("There were no babies named " + search.capitalize() + 
+              " born in Alberta between " + str(first_year(names)) + 
+              " and " + str(year))
         return
     
-    full_list = name_trend(names, year)    
+    # Only the searched for name is turned into the name_years layout.
+    search = " / ".join(spellings)
+    full_list = {search: name_years(name_data)}
+    
+    # Passing the data to search helper for rest of the work.
+    search_helper(full_list, search, records = get_records(names))
     
-    yr_dict = full_list[search]
-    yr_dict = dict(sorted(yr_dict.items()))
+def normalize_key(name):
+    '''
+    Returns the key used to look up a name the way users type it: accents 
+    are removed, the case is folded and anything that is not a letter or a 
+    digit (hyphens, apostrophes, spaces) is dropped.
+    Ex: 'Zoë' -> 'zoe', 'Mary-Ann' -> 'maryann', 'McKenzie' -> 'mckenzie'
     
-    boys = {}
-    girls = {}
+    Parameters:
+        name: str
     
-    # for name in the full_list, that has the following data (as ex.)
-    # {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
-    for list_name in full_list:
-        if list_name == search:     # If the name is same as being searched
-            # Acessing years in the keys.
-            for years in (yr_dict.keys()):      
-                try:
-                    # Case where name is given to only boys.
-                    # If Boy in {'Michael':{1980: [['Boy', 732], ['Girl', 705]]
-                    if  'Boy' in yr_dict[years][0]: 
-                        boys[years] = yr_dict[years][0][1]
-                        girls[years] = 0
-                            
-                    # Case where name is only given to girl
-                    # Ex: full_list[search][years][0] = ['Boy', 732]
-                    if 'Girl' in yr_dict[years][0]:   
-                        girls[years] = yr_dict[years][0][1]
-                        boys[years] = 0
-                        
-                    # Case where name is given to both boys and girls
-                    if 'Boy' in yr_dict[years][0] and \
-                    'Girl' in yr_dict[years][1]:       
-                        boys[years] = yr_dict[years][0][1]
-                        girls[years] = yr_dict[years][1][1]                        
-                       
-                except: pass
-    
-    display_data(boys, girls, search , year)
-    
-def display_data(boys, girls, search , year):
+    Return: str
     '''
-    Uses the mathplotlob module to implement the trend graph.
+    name = unicodedata.normalize('NFKD', str(name))
+    return "".join(char for char in name.casefold() if char.isalnum() and 
+                   not unicodedata.combining(char))
+
+def build_name_index(name_list):
+    '''
+    Expects the list of all names and returns the dictionary with the 
+    normalize_key(name) as key and the list of the original spellings 
+    having that key as value.
+    Ex: {'maryann': ['Mary-Ann', 'Maryann', 'Mary Ann']}
     
-     Parameters:
-        boys: dictionary
-               dictionary of the boys names with year as key and freq as value
-        girls: dictionary
-               dictionary of the girls names with year as key and freq as value
-        search: str: name of the person 
-        largest: int: largest freqency of boys/girl name
-         year: int
-              latest year
-    Return:  None
-    '''    
-   
-  
+    Parameters:
+        name_list: list of str
     
-    # adding zero to when there's no name to prevent dimension error
-    x_ticks = []
-    years = []
-    for yr in range(1980, year + 1):
-        years.append(yr)
-        
-        if yr not in boys: boys[yr] = 0        
-        if yr not in girls: girls[yr] = 0  
+    Return: dictionary
+    '''
+    index = {}
+    for name in name_list:
+        key = normalize_key(name)
+        if key in index:
+            index[key].append(name)
+        else:
+            index[key] = [name]
+    return index
+
+def name_index(names):
+    '''
+    Returns the normalized key index of the names, the one built at load time
+    for CompactNames, otherwise it is built now.
+    
+    Parameters:
+        names: dictionary or CompactNames
+               dictionary of all names
+    
+    Return: dictionary, see build_name_index(name_list)
+    '''
+    if isinstance(names, CompactNames):
+        return names.records['keys']
+    return build_name_index(list(names))
+
+def lookup_name(names, search, variants = False):
+    '''
+    Expects the names and the name typed by the user. Returns every original
+    spelling with the same normalize_key(search) and their combined data, the
+    frequencies of the spellings are added up per year and gender. With 
+    variants the other spellings of the name (see variant_groups) are added 
+    as well, e.g. 'muhammad' also finds Mohammad and Mohammed.
+    Ex: lookup_name(names, 'zoe') -> (['Zoe', 'Zoë'], 
+                                      [[58, 'Girl', 2018], [3, 'Girl', 2017]])
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        search: str
+              name to be searched
+        variants: bool
+              whether the spelling variants are added
+    
+    Return: tuple (spellings, name_data)
+        spellings: list of str, empty if the name was not found
+        name_data: list of list [frequency, gender, year] like names[name]
+    '''
+    spellings = name_index(names).get(normalize_key(search), [])
+    if variants and len(spellings) != 0:
+        spellings = variant_spellings(get_records(names), spellings)
+    if len(spellings) == 1:
+        return list(spellings), names[spellings[0]]
+    
+    combined = {}
+    for name in spellings:
+        for freq, gender, year in names[name]:
+            combined[(year, gender)] = combined.get((year, gender), 0) + freq
+    name_data = [[freq, gender, year] for (year, gender), freq in 
+                 sorted(combined.items())]
+    return list(spellings), name_data
+    
+def build_completion_index(records, k = COMPLETIONS):
+    '''
+    Builds the index of the normalized names (see normalize_key) used for 
+    the name completion. The keys are sorted, so the names starting with a 
+    prefix are one range of them, found by bisection. For the prefixes with 
+    more than COMPLETION_SCAN names the ids of the k most popular names 
+    (most babies over all years) are stored in one array; smaller ranges 
+    are ranked when asked.
+    Ex: {'keys': ['aaliyah', 'aaron', ...], 'ids': array([17, 3, ...]), 
+         'popularity': array([812, 40, ...]), 'prefixes': {'': 0, 'a': 1}, 
+         'top': array([[4, 9, ...], [3, 52, ...]])}
+    
+    Parameters:
+        records: dictionary
+               see build_records(names), without the 'completions' key yet
+        k: int
+              number of names kept for every stored prefix
+    
+    Return: dictionary with the keys
+        keys: sorted list of the key of every name
+        ids: numpy array of uint32, the name id of each key
+        popularity: numpy array of uint32, rank of each key's name, 0 is 
+                    the most popular
+        prefixes: dictionary prefix to row of top
+        top: numpy array of uint32 (row, k), name ids most popular first
+    '''
+    pairs = sorted((key, records['ids'][name]) 
+                   for key, spellings in records['keys'].items() 
+                   for name in spellings)
+    keys = [key for key, _ in pairs]
+    ids = np.array([i for _, i in pairs], dtype = np.uint32)
+    totals = np.bincount(records['name'], weights = records['count'], 
+                         minlength = len(records['names']))
+    rank = np.empty(len(totals), dtype = np.uint32)
+    rank[np.argsort(-totals, kind = 'stable')] = np.arange(len(totals))
+    popularity = rank[ids]
+    
+    prefixes, top = {}, []
+    ranges = [("", 0, len(keys))]
+    while ranges:
+        prefix, lo, hi = ranges.pop()
+        if hi - lo <= COMPLETION_SCAN:
+            continue
+        prefixes[prefix] = len(top)
+        best = np.argsort(popularity[lo:hi], kind = 'stable')[:k]
+        top.append(ids[lo + best])
+        # Ranges of the longer prefixes, keys equal to the prefix come first.
+        depth = len(prefix)
+        start = lo
+        while start < hi and len(keys[start]) == depth:
+            start += 1
+        for char, group in itertools.groupby(range(start, hi), 
+                                             key = lambda j: keys[j][depth]):
+            group = list(group)
+            ranges.append((prefix + char, group[0], group[-1] + 1))
+    return {'keys': keys, 'ids': ids, 'popularity': popularity, 
+            'prefixes': prefixes, 
+            'top': np.array(top, dtype = np.uint32).reshape(len(top), -1) 
+                   if top else np.zeros((0, k), dtype = np.uint32)}
+
+def complete_names(names, prefix, limit = COMPLETIONS):
+    '''
+    Returns the most popular names starting with the prefix, case, accents 
+    and punctuation are ignored. Uses the index built at load time by 
+    build_completion_index.
+    Ex: complete_names(names, 'mic') -> ['Michael', 'Michelle']
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        prefix: str
+              the beginning of the name typed by the user
+        limit: int
+              largest number of names returned, at most COMPLETIONS
+    
+    Return: list of str, most popular first
+    '''
+    records = get_records(names)
+    index = records['completions']
+    prefix = normalize_key(prefix)
+    lo = bisect.bisect_left(index['keys'], prefix)
+    hi = bisect.bisect_left(index['keys'], prefix + chr(sys.maxunicode), lo)
+    limit = min(limit, COMPLETIONS)
+    if prefix in index['prefixes']:
+        ids = index['top'][index['prefixes'][prefix]][:limit]
+    else:
+        best = np.argsort(index['popularity'][lo:hi], kind = 'stable')
+        ids = index['ids'][lo + best[:limit]]
+    return [records['names'][i] for i in ids.tolist()]
+
+def ask_name(names, prompt = "Enter a name: "):
+    '''
+    Asks the user for a name with completion. When the readline module is 
+    available the tab key completes the name, and on every system ending the
+    name with a question mark (e.g. "mic?") prints the most popular names 
+    starting with it and asks again.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        prompt: str
+    
+    Return: str, the name entered
+    '''
+    def completer(text, state):
+        matches = complete_names(names, text)
+        return matches[state] if state < len(matches) else None
+    
+    if readline is not None:
+        old_completer = readline.get_completer()
+        old_delims = readline.get_completer_delims()
+        readline.set_completer(completer)
+        readline.set_completer_delims("")     # names can have spaces
+        readline.parse_and_bind("tab: complete")
+    try:
+        search = input(prompt)
+        while search.endswith("?"):
+            matches = complete_names(names, search[:-1])
+            if len(matches) == 0:
+                print("No names start with " + search[:-1])
+            else:
+                print("  ".join(matches))
+            search = input(prompt)
+    finally:
+        if readline is not None:
+            readline.set_completer(old_completer)
+            readline.set_completer_delims(old_delims)
+    return search
+
+def serve_completions(names, port = 8000, host = "127.0.0.1"):
+    '''
+    Serves the name completion and the trend charts over HTTP until the user
+    presses Ctrl+C. 
+    GET /complete?q=mic&limit=5 answers with the JSON list of names, e.g. 
+    ["Michael", "Michelle"].
+    GET /chart?name=Charlie&gender=both&start=2000&end=2018&style=default&
+    format=png&scale=count answers with the chart from cached_chart, only 
+    name is needed.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        port: int
+        host: str
+              address listened on, only this computer by default
+    
+    Return: NONE
+    '''
+    class CompletionHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            query = urllib.parse.parse_qs(url.query)
+            if url.path == "/complete":
+                limit = query.get('limit', [str(COMPLETIONS)])[0]
+                limit = int(limit) if limit.isdigit() else COMPLETIONS
+                body = json.dumps(complete_names(
+                    names, query.get('q', [''])[0], limit)).encode('utf-8')
+                content_type = "application/json"
+            elif url.path == "/chart":
+                body, content_type = chart_response(names, query)
+            else:
+                body = None
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
         
-        yr = str(yr)        
-        x_ticks.append(yr[2:])        
-            
-    boys_freq = list(boys.values())
-    girls_freq = list(girls.values()) 
+        def log_message(self, format, *args):
+            pass
     
+    try:
+        server = ThreadingHTTPServer((host, port), CompletionHandler)
+    except OSError as error:
+        print("Could not serve on port " + str(port) + ": " + 
+              (error.strerror or str(error)))
+        return
+    print("Serving completions on http://" + host + ":" + str(port) + 
+          "/complete?q=... (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
-    boys_freq = np.array(boys_freq)
-    girls_freq = np.array(girls_freq)
+def chart_response(names, query):
+    '''
+    Answers GET /chart of serve_completions, the query string parameters are 
+    passed to cached_chart.
     
-  
-    my_xticks  = np.array(x_ticks)
-    years = np.array(years)
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        query: dictionary from urllib.parse.parse_qs
+    
+    Return: tuple (bytes of the image, content type), (NONE, NONE) if the 
+            parameters are wrong or the name is not found
+    '''
+    get = lambda key, default: query.get(key, [default])[0]
+    fmt, gender = get('format', 'png'), get('gender', 'both')
+    start, end = get('start', ''), get('end', '')
+    if fmt not in CHART_TYPES or gender not in ('both',) + GENDERS or \
+       get('scale', 'count') not in SCALES or \
+       (start and not start.isdigit()) or (end and not end.isdigit()) or \
+       get('style', 'default') not in ('default',) + tuple(
+           matplotlib.style.available):
+        return None, None
+    data = cached_chart(names, get('name', ''), gender, 
+                        int(start) if start else None, 
+                        int(end) if end else None, 
+                        get('style', 'default'), fmt, get('scale', 'count'))
+    return data, CHART_TYPES[fmt]
+
+def completion_server(names):
+    '''
+    Asks the user for the port and calls serve_completions(names, port).
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+    
+    Return: NONE
+    '''
+    if len(names) == 0:
+        print("There are no data")
+        return
+    port = input("Enter the port [8000]: ").strip()
+    while len(port) != 0 and not (port.isdigit() and 
+                                  1 <= int(port) <= 65535):
+        port = input("Enter the port [8000]: ").strip()
+    serve_completions(names, int(port) if port else 8000)
+
+def name_years(name_data):
+    '''
+    Expects the list of [frequency, gender, year] of one name and turns it 
+    into a dictionary with year as key that has list of list of boys/girls 
+    freq, the layout used by search_helper and print_matches.
+    # Ex: [[732, 'Boy', 1980], [705, 'Girl', 1980]] into
+    #     {1980: [['Boy', 732], ['Girl', 705]]}
     
+    Parameters:
+        name_data: list of list
+              frequency, gender and year of one name
     
+    Return: yr_dict: dictionary
+    '''
+    yr_dict = {}
+    for freq, gender, year in name_data:
+        # if year has not been added, then add.
+        if year not in yr_dict:
+            yr_dict[year] = []
+        yr_dict[year].append([gender, freq])
+    return yr_dict
 
-    plt.ylabel('Frequency of Name')
-    plt.xlabel('Years')
-    plt.title(f"Trend for the name {search}")
-    plt.xticks(years, my_xticks)
-    plt.plot(years, girls_freq, label = "Girls")        
-    plt.plot(years, boys_freq, label = "Boys")
-    plt.legend()                
-    plt.show()
 
+def open_file(fName):
+    '''
+    Expects the filename string (including ".xlsx" suffix) of a Excel .xlsx 
+    file, structured as follows:
+    1	    Michael	   732	           Boy	        1980
+    2	    Christopher	   633	           Boy	        1980 <--Start At line 7
+    :       :              :               :             :
+    2,175   Eloise         1               Girl         2018
+    
+    extracts the data, starting at row 7, find the latest year in the data. 
+    Then return the raw data in the form of a list of lists where each list is
+    a row of data from the Excel, i.e. [rank, name, frequency, gender, year]. 
+    The latest year in the data must be an integer. The first 6 rows must not 
+    be included.The raw data list of lists and the latest year are
+    returned.
+    
+     Parameters:
+        fName: Name of the file
+    Return:
+        data: list 
+              data is in the form of a list of lists where each list is
+    a row of data from the Excel, i.e. [rank, name, frequency, gender, year]. 
+        max_year: int
+                 latest year in the data
+    '''
+    
+    try:
+        wk_bk = load_workbook(fName, data_only = True)
+    except:
+        print("File does not exist")
+        return
+      
+    
+    sheet = wk_bk.active
+    row_max, col_max = sheet.max_row, sheet.max_column  
+    
+    col_max_letter = chr(ord('A') + sheet.max_column - 1)   # Last column: 'E'
+    col_last = chr(ord('A') + sheet.max_column - 1)  
+    cell_last = col_last + str(row_max)
+    max_cell = col_max_letter + str(sheet.max_row)
+    
+    data = [ ]
+    rows = sheet['A7': cell_last]       # To be returned, skips first 6 lines
+    
+    # Go thru the rows, put all of the row data in alist and append that
+    # list to 
+    for row in rows:                    # Iterate vertically over rows
+        row_data = [ ]                  # New list for row
+        for cell in row:                # Iterate over every element in a row
+            if isinstance(cell.value, str) and cell.value[0] == '=':
+                row_data.append(data[len(data)-1][0])                
+            else:            
+                row_data.append(cell.value)
+        row_data[-1] = str(row_data[-1])
+        data.append(row_data)           # Add it to final list
+        		
+    max_year = data[-1][-1]
+     
+    return data, int(max_year)
+    
+    
+def create_names_dict(data, names):    
+    '''
+    Expects the raw data extracted from the Excel file in open_file and an 
+    empty dictionary as parameters. This function processes the raw data and 
+    returns the dictionary using names as keys and a list of lists each 
+    containing frequency, gender, and year as the value. This dictionary is 
+    returned. 
+    For example:
+    {..., 'Kelly': [[69,'Boy',1980], 
+                   [61, 'Boy', 1981], 
+                   [53, 'Boy', 1982],
+                   [37, 'Boy', 1983], 
+                   [32, 'Boy', 1984], 
+                   [123, 'Girl', 1980], ...}
+    Parameters:
+        data: raw data
+        names: empty dictionary
+    
+    Return:
+        names: dictionary 
+               containing names as keys and a list of lists  each 
+        containing frequency, gender, and year as the value.
+    '''
+    
+    # Coverts year to int from str.
+    count = 0
+    for i in data:
+        data[count][-1] = int(data[count][-1])
+        count += 1
+    
+    for i in range(len(data)):
+        name = data[i][1]        
+        # If name isn't in names, add that to dict as key value
+        if name not in names.keys():
+            names[name] = []          
+            names[name] = [data[i][2:]] # [data[i][2:]] = frequency, gender, yr
+        else:
+            names[name].append(data[i][2:]) # [32, 'Boy', 1984]
+    return names
+
+def create_top_ten_dict(data, names):
+    '''
+    Expects raw data extracted from the Excel file in open_file and an empty 
+    dictionary as parameters. This function processes the raw data and returns 
+    the dictionary using years as keys and a list of lists each containing 
+    rank, name, gender, and year as the value. For example:
+    {1980: [[1, 'Michael', 732, 'Boy'], [2, 'Christopher', 633, 'Boy'], 
+    [3, 'David', 537, 'Boy']...}
+    
+    Parameters:
+        data: raw data
+        names: empty dictionary
+    
+    Return:
+        names: dictionary 
+               containing years as keys and a list of lists each 
+        containing rank, name, gender, and year as the value.
+    
+        '''
+    
+    for i in range(len(data)):
+        rank = data[i][0]
+        year = int(data[i][4])    
+        
+        if isinstance(rank, int) == True and rank < 11:
+            if year in names.keys():
+                names[year].append(data[i][:4]) #[1, 'Michael', 732, 'Boy']
+            else:
+                names[year] = []            
+                names[year] = [data[i][:4]] # rank, name, gender, and year                  
+    return names
+
+def print_top_ten(names, max_year, version = None, records = None):
+    '''
+    Expects the dictionary of top ten lists and the latest year as parameters. 
+    This function calls ask the user for a year, error checks to ensure that 
+    the year is in the range from the first to the latest year, and prints the 
+    top ten list of names with their frequencies for that year, girls first, 
+    in the output format of SETTINGS['format']. With the version of the data
+    the list of the year is kept in the query cache. With the records of all
+    names the frequencies can be printed as rates (see SETTINGS['scale']) 
+    and the spellings of a name can be counted together (see 
+    SETTINGS['variants'] and variant_top_ten).
+    
+    Parameters:  names: dictionary
+                          dictionary of top ten lists
+                 max_year: int
+                          latest year
+                 version: str
+                          version of the data, see dataset_version
+                 records: dictionary
+                          records of all names, see build_records
+                          
+    Return: NONE 
+    '''
+    if len(names.keys()) == 0:
+        print("There are no data")
+        return    
+    
+    start = min(names.keys())   # first year of the data
+    prompt = "Enter year (" + str(start) + " to " + str(max_year) + "): "
+    year = input(prompt)
+    while True:
+        if len(year) != 0 and year.isdigit():
+            year = int(year)
+            if start <= year <= max_year:
+                break
+        year = input(prompt)
+        
+    if SETTINGS['variants'] and records is not None:
+        query, kind = (lambda: variant_top_ten(records, year)), 'variant_top'
+    else:
+        query, kind = (lambda: top_ten_rows(names, year)), 'top_ten'
+    if version is None:
+        rows = query()
+    else:
+        rows = cached_query(version, kind, (year,), query)
+    rows = scaled(records, rows, top_ten_rates)
+    render(TOP_TEN_COLUMNS, rows, layout = top_ten_layout)
+
+def top_ten_rows(names, year):
+    '''
+    Splits the top ten list of a year into the girls and the boys and returns
+    the rows printed by print_top_ten, [year, rank, name, frequency, gender]
+    with the girls first.
+    
+    Parameters:  names: dictionary
+                          dictionary of top ten lists
+                 year: int
+                          
+    Return: list of lists
+    '''
+    b_data, g_data = [], []
+    for data in names.get(year, []): 
+        if data[-1] == 'Boy':       
+            b_data.append(data)     # b_data: have only the boys data    
+        elif data[-1] == 'Girl':
+            g_data.append(data)     # g_data: have only the girls data
+           
+    return [[year] + data for data in g_data + b_data]
+    
+def wildcard_search(names):
+    '''
+    Expects the names dictionary as a parameter. This function allows the user 
+    to enter a name with an asterisk (*) representing missing letter(s). 
+    This function is case insensitive. The asterisk can be anywhere:
+    a) names ending with an asterisk, e.g. franc*
+    b) names starting with an asterisk, e.g. *elly
+    c) names with an asterisk not at the beginning or the end, e.g. moh*had
+    
+    The user picks the order of the results (see WILDCARD_ORDERS). Matches are
+    streamed from wildcard_page(names, search, order, limit, offset) one 
+    page of PAGE_SIZE names at a time, and the user is asked before the next 
+    page is printed.
+    
+    Parameters:  names: dictionary
+                          dictionary of all the names
+                          
+    Return: NONE 
+    '''
+    
+    if len(names.keys()) == 0:
+        print("There are no data")
+        return
+    
+    search = input("Enter name with * indicating missing letters: ")
+    search = search.capitalize()
+    if "*" not in search:
+        print("No name found using " + search)
+        return
+    
+    prompt = "Order by (" + ", ".join(WILDCARD_ORDERS) + ") [frequency]: "
+    order = input(prompt).strip().lower()
+    while len(order) != 0 and order not in WILDCARD_ORDERS:
+        order = input(prompt).strip().lower()
+    if len(order) == 0:
+        order = 'frequency'
+    
+    offset = 0
+    while True:
+        # Ex: {'Michael': {1980: [['Boy', 732]], 1981: [['Boy', 705]]}}
+        page = dict(wildcard_page(names, search, order, PAGE_SIZE, offset))
+        if len(page) == 0:
+            if offset == 0:
+                print("No name found using " + search)
+            return
+        print_matches(page, list(page), records = get_records(names))
+        
+        offset += PAGE_SIZE
+        if len(page) < PAGE_SIZE:
+            return
+        more = input("\nShow more? (y/n) [n]: ").strip().lower()
+        if more[:1] != 'y':
+            return
+
+def wildcard_pattern(search):
+    '''
+    Expects the name with asterisks standing for missing letters and returns 
+    a compiled regular expression matching the whole normalize_key(name), so
+    case, accents and hyphens are ignored.
+    Ex: 'moh*had' matches 'Mohammad' and 'Mohamad'
+    
+    Parameters:
+        search: str
+              name with * indicating missing letters
+    
+    Return: compiled regular expression
+    '''
+    parts = [re.escape(normalize_key(part)) for part in search.split("*")]
+    return re.compile(".*".join(parts))
+
+def iter_wildcard(names, search):
+    '''
+    Expects the dictionary of names and the name with asterisks. This is a 
+    generator, it yields the matching names lazily so nothing is built for 
+    names that are never looked at. The pattern is matched against the keys
+    of name_index(names) and every spelling of a matching key is yielded.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        search: str
+              name with * indicating missing letters
+    
+    Return: generator of str
+    '''
+    match = wildcard_pattern(search).fullmatch
+    for key, spellings in name_index(names).items():
+        if match(key):
+            yield from spellings
+
+def wildcard_page(names, search, order = 'frequency', limit = PAGE_SIZE, 
+                  offset = 0):
+    '''
+    One page of ranked_wildcard(names, search, order, limit, offset) as a 
+    list, kept in the query cache. Patterns with the same normalized parts 
+    (e.g. 'Moh*' and 'moh*') share the cached page.
+    
+    Parameters: same as ranked_wildcard
+    
+    Return: list of tuples (name, yr_dict)
+    '''
+    parts = tuple(normalize_key(part) for part in search.split("*"))
+    return cached_query(dataset_version(names), 'wildcard', 
+                        (parts, order, limit, offset), 
+                        lambda: list(ranked_wildcard(names, search, order, 
+                                                     limit, offset)))
+
+def name_total(name_data):
+    '''
+    Expects the list of [frequency, gender, year] of one name and returns the 
+    total frequency over all years and both genders.
+    
+    Parameters:
+        name_data: list of list
+              Ex: [[732, 'Boy', 1980], [705, 'Boy', 1981]]
+    
+    Return: int
+    '''
+    return sum(entry[0] for entry in name_data)
+
+def name_peak(name_data):
+    '''
+    Expects the list of [frequency, gender, year] of one name and returns a 
+    tuple of the year with the most babies given that name (both genders 
+    together) and the frequency in that year.
+    
+    Parameters:
+        name_data: list of list
+              Ex: [[732, 'Boy', 1980], [705, 'Boy', 1981]]
+    
+    Return: tuple (year, frequency)
+    '''
+    per_year = {}
+    for freq, _, year in name_data:
+        per_year[year] = per_year.get(year, 0) + freq
+    year = max(per_year, key = lambda yr: (per_year[yr], yr))
+    return year, per_year[year]
+
+def ranked_wildcard(names, search, order = 'frequency', limit = None, 
+                    offset = 0):
+    '''
+    Expects the dictionary of names, the name with asterisks, the order of 
+    the results and the page wanted (limit and offset). This is a generator, 
+    it yields (name, yr_dict) for the names of that page only.
+    Orders:
+        frequency: most babies over all years first
+        peak:      most recent peak year first, ties by frequency that year
+        name:      alphabetical
+        none:      dictionary order, streamed without looking at the rest
+    The ranked orders keep only the best offset + limit names in a heap while 
+    streaming the matches, so a pattern matching most of the names does not 
+    sort the whole catalog.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        search: str
+              name with * indicating missing letters
+        order: str
+              one of WILDCARD_ORDERS
+        limit: int
+              number of names in the page, None for all of them
+        offset: int
+              number of names skipped before the page
+    
+    Return: generator of tuples (name, yr_dict)
+            Ex: ('Michael', {1980: [['Boy', 732]], 1981: [['Boy', 705]]})
+    '''
+    matches = iter_wildcard(names, search)
+    stop = None if limit is None else offset + limit
+    
+    if order == 'none':
+        page = itertools.islice(matches, offset, stop)
+    elif stop is None:
+        page = sorted(matches, key = WILDCARD_KEYS[order](names), 
+                      reverse = order != 'name')[offset:]
+    elif order == 'name':
+        page = heapq.nsmallest(stop, matches)[offset:]
+    elif order in WILDCARD_KEYS:
+        page = heapq.nlargest(stop, matches, 
+                              key = WILDCARD_KEYS[order](names))[offset:]
+    else:
+        raise ValueError("Unknown order " + str(order))
+    
+    for name in page:
+        yield name, name_years(names[name])
+    
+def print_matches(full_list, match_names, fmt = None, stream = None, 
+                  records = None):
+    '''
+    Expects the dictionary of all names in which data sorted is with separate 
+    years and the list of names matched by a wildcard search. Prints every 
+    match with its boys and girls frequency for each year, the whole result 
+    is rendered in one buffered write.
+    
+    Parameters:
+        full_list: dictionary
+               dictionary of all names, data sorted with separate years.
+        match_names: list of str
+               names to be printed
+        fmt: str
+             output format, default is SETTINGS['format']
+        stream: file object, default is sys.stdout
+        records: dictionary
+              records of all names, see search_helper
+    
+    Return: NONE
+    '''
+    rows = ([n] + row for n in match_names for row in year_rows(full_list[n]))
+    rows = scaled(records, rows, trend_rates)
+    render(TREND_COLUMNS, rows, fmt, stream, wildcard_layout)
+
+def plot(names, year, method = None, search = None):
+    '''
+    Uses the matplotlib module to implement the trend graph. The name is 
+    looked up with lookup_name(names, search), all its spellings are plotted
+    together, as babies or as babies per 1,000 births (SETTINGS['scale']).
+    
+     Parameters:
+        names: dictionary
+               dictionary of all names
+        year: int
+              latest year
+        method: str
+              one of FORECAST_METHODS to draw the forecast of next year as 
+              a dashed line, None for no forecast
+        search: str
+              name to plot, None to ask the user
+              
+    Return:  None
+    '''    
+    
+    if len(names.keys()) == 0:
+        print("There are no data")
+        return
+    
+    if search is None:
+        search = ask_name(names)
+    spellings, name_data = lookup_name(names, search, SETTINGS['variants'])
+    if len(spellings) == 0:
+        print("There were no babies named " + search.capitalize() + 
+              " born in Alberta between " + str(first_year(names)) + 
+              " and " + str(year))
+        return
+    
+    search = " / ".join(spellings)
+    full_list = {search: name_years(name_data)}
+    
+    boys = {}
+    girls = {}
+    
+    # for name in the full_list, that has the following data (as ex.)
+    # {'Michael': {1980: [['Boy', 732], ['Girl', 705]]
+    for years, boy_freq, girl_freq in year_rows(full_list[search]):
+        boys[years] = boy_freq
+        girls[years] = girl_freq
+    
+    records = get_records(names)
+    next_year = None
+    if method is not None:
+        # The forecasts are linear, so the spellings' forecasts add up.
+        fc = forecast_names(names, method)
+        ids = [records['ids'][name] for name in spellings]
+        next_year = (fc['year'], int(fc['counts'][0, ids].sum()), 
+                     int(fc['counts'][1, ids].sum()))
+    
+    scale = SETTINGS['scale']
+    if scale == 'rate':
+        rows = trend_rates(records, [[search, yr, boys[yr], girls[yr]] 
+                                     for yr in boys])
+        boys = {yr: b for _, yr, b, _ in rows}
+        girls = {yr: g for _, yr, _, g in rows}
+        if next_year is not None:
+            # The births of next year are not known, the latest year's are.
+            latest = [next_year[0] - 1] * 2
+            next_year = ((next_year[0],) + tuple(per_thousand(
+                records, next_year[1:], np.arange(len(GENDERS)), 
+                latest).tolist()))
+    
+    display_data(boys, girls, search , year, first_year(names), next_year, 
+                 SCALE_LABELS[scale])
+    
+def display_data(boys, girls, search , year, start = 1980, forecast = None, 
+                 ylabel = 'Frequency of Name'):
+    '''
+    Uses the mathplotlob module to implement the trend graph.
+    
+     Parameters:
+        boys: dictionary
+               dictionary of the boys names with year as key and freq as value
+        girls: dictionary
+               dictionary of the girls names with year as key and freq as value
+        search: str: name of the person 
+        largest: int: largest freqency of boys/girl name
+         year: int
+              latest year
+         start: int
+              first year of the data
+         forecast: tuple (year, boys, girls) of the next year drawn as a 
+              dashed line, None for no forecast
+         ylabel: str
+              label of the frequency axis
+    Return:  None
+    '''    
+   
+  
+    
+    # adding zero to when there's no name to prevent dimension error
+    years = []
+    for yr in range(start, year + 1):
+        years.append(yr)
+        
+        if yr not in boys: boys[yr] = 0        
+        if yr not in girls: girls[yr] = 0  
+        
+            
+    # In the order of the years, the zeros were added after the other years.
+    boys_freq = [boys[yr] for yr in years]
+    girls_freq = [girls[yr] for yr in years]
+    
+
+    boys_freq = np.array(boys_freq)
+    girls_freq = np.array(girls_freq)
+    years = np.array(years)
+    
+    draw_trend(plt.gca(), years, boys_freq, girls_freq, search, forecast, 
+               ylabel)
+    plt.show()
+
+def draw_trend(ax, years, boys_freq, girls_freq, search, forecast = None, 
+               ylabel = 'Frequency of Name'):
+    '''
+    Draws the trend graph of display_data on the matplotlib axes, so the same
+    chart can be drawn on screen or saved to a file.
+    
+    Parameters:
+        ax: matplotlib axes
+        years: numpy array of the years
+        boys_freq: numpy array of the boys frequency in each year, None to 
+                   leave the boys out
+        girls_freq: numpy array of the girls frequency in each year, None to
+                   leave the girls out
+        search: str: name of the person
+        forecast: tuple (year, boys, girls) of the next year drawn as a 
+                  dashed line continuing each series, None for no forecast
+        ylabel: str: label of the frequency axis
+    Return:  None
+    '''
+    ticks = list(years)
+    if forecast is not None:
+        ticks.append(forecast[0])
+    trend_axes(ax, ticks, f"Trend for the name {search}", ylabel)
+    lines = []
+    if girls_freq is not None:
+        line, = ax.plot(years, girls_freq, label = "Girls")
+        lines.append((line, girls_freq, 2))
+    if boys_freq is not None:
+        line, = ax.plot(years, boys_freq, label = "Boys")
+        lines.append((line, boys_freq, 1))
+    if forecast is not None and len(years) != 0:
+        for line, freq, i in lines:
+            ax.plot([years[-1], forecast[0]], [freq[-1], forecast[i]], 
+                    linestyle = '--', color = line.get_color())
+    ax.legend()                
+
+def trend_axes(ax, ticks, title, ylabel):
+    '''
+    Sets the title, the labels and the year ticks (shown as 2 digits) of 
+    the trend graph, shared by draw_trend and draw_archetypes.
+    
+    Parameters:
+        ax: matplotlib axes
+        ticks: list of the years
+        title: str
+        ylabel: str: label of the frequency axis
+    Return:  None
+    '''
+    my_xticks = [str(yr)[2:] for yr in ticks]
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel('Years')
+    ax.set_title(title)
+    ax.set_xticks(ticks)
+    ax.set_xticklabels(my_xticks)
+    
+def dataset_version(names):
+    '''
+    Returns the version of the loaded data, a hash of all its names and 
+    rows. Loading the data again (or other data) gives another version, so 
+    anything cached under the old version is not used any more.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+    
+    Return: str, hex digest
+    '''
+    records = get_records(names)
+    if 'version' not in records:
+        digest = hashlib.sha1("\n".join(records['names']).encode('utf-8'))
+        for key in ('name', 'gender', 'year', 'count'):
+            digest.update(records[key].tobytes())
+        records['version'] = digest.hexdigest()
+    return records['version']
+
+def render_chart(names, search, gender = 'both', start = None, end = None, 
+                 style = 'default', fmt = 'png', scale = 'count'):
+    '''
+    Draws the trend graph of display_data for a name (all spellings of it) 
+    into an image file in memory. Returns NONE if the name is not found.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        search: str
+              name to be drawn
+        gender: str
+              'Boy', 'Girl' or 'both'
+        start, end: int
+              first and last year, default is the years of the data
+        style: str
+              matplotlib style, e.g. 'default' or 'ggplot'
+        fmt: str
+             'png' or 'svg'
+        scale: str
+             'count' or 'rate' (babies per 1,000 births)
+    
+    Return: bytes of the image
+    '''
+    spellings, _ = lookup_name(names, search)
+    if len(spellings) == 0:
+        return
+    boys, _, years = trend_matrix(names, [search], start, end, 'Boy', scale)
+    girls, _, _ = trend_matrix(names, [search], start, end, 'Girl', scale)
+    
+    buf = io.BytesIO()
+    with CHART_LOCK, matplotlib.style.context(style):
+        fig = Figure(figsize = (8, 5))
+        FigureCanvasAgg(fig)
+        draw_trend(fig.add_subplot(1, 1, 1), years, 
+                   boys[0] if gender in ('both', 'Boy') else None, 
+                   girls[0] if gender in ('both', 'Girl') else None, 
+                   " / ".join(spellings), ylabel = SCALE_LABELS[scale])
+        fig.savefig(buf, format = fmt)
+    return buf.getvalue()
+
+def cached_chart(names, search, gender = 'both', start = None, end = None, 
+                 style = 'default', fmt = 'png', scale = 'count'):
+    '''
+    Returns the chart of render_chart from the chart cache on disk, and 
+    draws and stores it there first if it is not cached yet. The cache file 
+    is named after the dataset version and a hash of the other parameters, 
+    the name is normalized first so 'zoe' and 'Zoë' share their chart.
+    The cache keeps at most CHART_CACHE['max_bytes'], the least recently 
+    used charts are removed first (see evict_charts).
+    
+    Parameters: same as render_chart
+    
+    Return: bytes of the image, NONE if the name is not found
+    '''
+    version = dataset_version(names)
+    key = repr((normalize_key(search), gender, start, end, style, fmt, scale))
+    file_name = (version[:16] + "-" + 
+                 hashlib.sha1(key.encode('utf-8')).hexdigest() + "." + fmt)
+    cache_dir = CHART_CACHE['dir']
+    path = os.path.join(cache_dir, file_name)
+    
+    try:
+        with open(path, "rb") as chart_file:
+            data = chart_file.read()
+        os.utime(path)      # last use, for the eviction
+        return data
+    except OSError:
+        pass
+    
+    data = render_chart(names, search, gender, start, end, style, fmt, scale)
+    if data is None:
+        return
+    os.makedirs(cache_dir, exist_ok = True)
+    # Written under another name first so a reader never sees half a file, 
+    # the name is unique so threads drawing the same chart do not collide.
+    handle, temp = tempfile.mkstemp(suffix = ".tmp", dir = cache_dir)
+    with os.fdopen(handle, "wb") as chart_file:
+        chart_file.write(data)
+    os.replace(temp, path)
+    evict_charts(cache_dir, CHART_CACHE['max_bytes'], version)
+    return data
+
+def evict_charts(cache_dir, max_bytes, version):
+    '''
+    Removes the charts of other dataset versions from the cache, then the 
+    least recently used charts until the cache is not larger than max_bytes.
+    
+    Parameters:
+        cache_dir: str
+              folder of the chart cache
+        max_bytes: int
+              largest size of the cache
+        version: str
+              version of the loaded data, see dataset_version
+    
+    Return: NONE
+    '''
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not entry.is_file() or entry.name.endswith(".tmp"):
+            continue
+        try:
+            if not entry.name.startswith(version[:16] + "-"):
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+        except OSError:
+            continue            # removed by another process
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+def cached_query(version, kind, params, query):
+    '''
+    Returns query() from the query cache, and runs it and stores its result 
+    first if it is not cached yet. The key is the dataset version (see 
+    dataset_version), the kind of query and its normalized parameters, so 
+    loading other data never gives an old result. The cache keeps the 
+    QUERY_CACHE['max_size'] most recently used results. The results are 
+    shared, callers must not change them.
+    
+    Parameters:
+        version: str
+              version of the data the query runs on
+        kind: str
+              name of the query, e.g. 'wildcard'
+        params: tuple
+              normalized parameters of the query, must be hashable
+        query: function without parameters that runs the query
+    
+    Return: result of query()
+    '''
+    key = (version, kind, params)
+    entries = QUERY_CACHE['entries']
+    with QUERY_LOCK:
+        if key in entries:
+            entries.move_to_end(key)
+            QUERY_CACHE['hits'] += 1
+            return entries[key]
+        QUERY_CACHE['misses'] += 1
+    
+    result = query()
+    with QUERY_LOCK:
+        entries[key] = result
+        entries.move_to_end(key)
+        while len(entries) > QUERY_CACHE['max_size']:
+            entries.popitem(last = False)
+    return result
+
+def clear_query_cache():
+    '''
+    Empties the query cache, called when other data is loaded so the results 
+    of the old data do not take memory any more. The counters are kept.
+    '''
+    with QUERY_LOCK:
+        QUERY_CACHE['entries'].clear()
+
+def query_cache_stats():
+    '''
+    Returns the counters of the query cache.
+    
+    Return: dictionary with the keys 'hits', 'misses', 'size' and 'max_size'
+    '''
+    with QUERY_LOCK:
+        return {'hits': QUERY_CACHE['hits'], 'misses': QUERY_CACHE['misses'],
+                'size': len(QUERY_CACHE['entries']), 
+                'max_size': QUERY_CACHE['max_size']}
+
+def get_records(names):
+    '''
+    Returns the compact records of the names, see build_records(names).
+    
+    Parameters:
+        names: dictionary or CompactNames
+               dictionary of all names
+    
+    Return: records: dictionary
+    '''
+    return compact_names(names).records
+
+def first_year(names):
+    '''
+    Returns the first year of the names data, 1980 when there are no data.
+    
+    Parameters:
+        names: dictionary or CompactNames
+               dictionary of all names
+    
+    Return: int
+    '''
+    records = get_records(names)
+    if len(records['year']) == 0:
+        return 1980
+    return int(records['year'].min())
+
+def count_matrix(records):
+    '''
+    Expects the compact records and returns the frequencies as one array of 
+    shape (genders, names, years), index [0] are the boys and [1] the girls, 
+    rows are in the order of records['names'] and columns are the years from 
+    the first to the latest year. Years without the name are zero.
+    The array is made once and kept in the records.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+    
+    Return: tuple (matrix, years)
+        matrix: numpy array of uint32
+        years: numpy array of the years of the columns
+    '''
+    if 'matrix' not in records:
+        n_names = len(records['names'])
+        if len(records['year']) == 0:
+            years = np.arange(0)
+        else:
+            years = np.arange(records['year'].min(), 
+                              records['year'].max() + 1)
+        n_years = len(years)
+        
+        # One flat index per row, bincount adds up rows with the same key.
+        flat = ((records['gender'].astype(np.int64) * n_names + 
+                 records['name']) * n_years + 
+                (records['year'].astype(np.int64) - 
+                 (years[0] if n_years else 0)))
+        size = len(GENDERS) * n_names * n_years
+        totals = np.bincount(flat, weights = records['count'], 
+                             minlength = size)
+        records['matrix'] = totals.astype(np.uint32).reshape(
+            len(GENDERS), n_names, n_years)
+        records['years'] = years
+    return records['matrix'], records['years']
+
+def trend_matrix(names, name_list, start = None, end = None, gender = 'both', 
+                 scale = 'count', variants = False):
+    '''
+    Library function for notebooks: the trends of many names at once as one 
+    array with a row per name and a column per year, gathered from 
+    count_matrix in one step. Each name is looked up like lookup_name (all 
+    spellings added together); names that are not found get a row of zeros 
+    so the rows always line up with name_list. Years outside the data are 
+    zero as well.
+    Ex: counts, rows, years = trend_matrix(names, ['Emma', 'Liam'], 2000)
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names, e.g. load_dataset(fName)[0]
+        name_list: list of str
+              names wanted, in the order of the rows
+        start: int
+              first year, default is the first year of the data
+        end: int
+              last year, default is the latest year of the data
+        gender: str
+              'Boy', 'Girl' or 'both' (boys and girls added together)
+        scale: str
+              'count' for the number of babies, 'rate' for babies per 1,000 
+              births of the same year and gender (see per_thousand)
+        variants: bool
+              whether the other spellings of each name are added (see 
+              variant_groups)
+    
+    Return: tuple (counts, name_list, years)
+        counts: numpy array of int64, shape (len(name_list), len(years)), 
+                float for the rates
+        name_list: list of str, the row labels
+        years: numpy array of the column labels
+    '''
+    records = get_records(names)
+    matrix, data_years = count_matrix(records)
+    if start is None:
+        start = int(data_years[0]) if len(data_years) else 0
+    if end is None:
+        end = int(data_years[-1]) if len(data_years) else -1
+    years = np.arange(start, end + 1)
+    name_list = list(name_list)
+    counts = np.zeros((len(name_list), len(years)), dtype = np.int64)
+    
+    # Row of the result and id of the name for every spelling found.
+    rows, ids = [], []
+    for row, search in enumerate(name_list):
+        spellings = records['keys'].get(normalize_key(search), [])
+        if variants and len(spellings) != 0:
+            spellings = variant_spellings(records, spellings)
+        for name in spellings:
+            rows.append(row)
+            ids.append(records['ids'][name])
+    if len(ids) == 0 or len(data_years) == 0:
+        return counts, name_list, years
+    
+    if gender == 'both':
+        genders = slice(None)
+    elif gender in GENDERS:
+        genders = slice(GENDERS.index(gender), GENDERS.index(gender) + 1)
+    else:
+        raise ValueError("Unknown gender " + str(gender))
+    
+    # Only the years both in the data and in the range are copied.
+    first = max(start, int(data_years[0]))
+    last = min(end, int(data_years[-1]))
+    if first <= last:
+        source = slice(first - int(data_years[0]), 
+                       last - int(data_years[0]) + 1)
+        target = slice(first - start, last - start + 1)
+        gathered = matrix[genders, np.array(ids), source].sum(axis = 0, 
+                                                              dtype = np.int64)
+        np.add.at(counts[:, target], np.array(rows), gathered)
+    if scale == 'rate':
+        codes = gender if gender == 'both' else GENDERS.index(gender)
+        counts = per_thousand(records, counts, codes, 
+                              np.broadcast_to(years, counts.shape))
+    return counts, name_list, years
+
+def boy_shares(boys, girls):
+    '''
+    Returns the share of boys (0 to 1) element by element, NaN where there 
+    are no babies at all.
+    
+    Parameters:
+        boys: numpy array of frequencies
+        girls: numpy array of frequencies, same shape as boys
+    
+    Return: numpy array of float
+    '''
+    total = boys.astype(np.float64) + girls
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return np.where(total > 0, boys / total, np.nan)
+
+def crossover_names(records, to_gender = 'Girl', min_count = 10, 
+                    limit = 20):
+    '''
+    Finds the names that crossed from mostly boys to mostly girls (or the 
+    other way round with to_gender 'Boy') for the whole catalog at once. A 
+    name crossed when it was mostly given to one gender in the first year 
+    with at least min_count babies and mostly to the other gender in the 
+    last such year. Names are ranked by how far the share moved, then by 
+    their frequency.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+        to_gender: str
+              'Girl' for boys to girls, 'Boy' for girls to boys
+        min_count: int
+              least number of babies for a year to count
+        limit: int
+              number of names returned
+    
+    Return: list of lists 
+        [name, first year, boys % then, last year, boys % then, total]
+    '''
+    matrix, years = count_matrix(records)
+    boys, girls = matrix[0], matrix[1]
+    total = boys.astype(np.int64) + girls
+    valid = total >= min_count
+    has_valid = valid.any(axis = 1)
+    
+    rows = np.arange(len(total))
+    first = valid.argmax(axis = 1)
+    last = valid.shape[1] - 1 - valid[:, ::-1].argmax(axis = 1)
+    share = boy_shares(boys, girls)
+    first_share, last_share = share[rows, first], share[rows, last]
+    
+    if to_gender == 'Girl':
+        crossed = has_valid & (first_share > 0.5) & (last_share < 0.5)
+    else:
+        crossed = has_valid & (first_share < 0.5) & (last_share > 0.5)
+    swing = np.abs(first_share - last_share)
+    
+    picked = np.flatnonzero(crossed)
+    order = np.lexsort((-total.sum(axis = 1)[picked], -swing[picked]))
+    result = []
+    for i in picked[order[:limit]]:
+        result.append([records['names'][i], int(years[first[i]]), 
+                       round(100 * float(first_share[i]), 1), 
+                       int(years[last[i]]), 
+                       round(100 * float(last_share[i]), 1), 
+                       int(total[i].sum())])
+    return result
+
+def unisex_names(records, year, min_count = 10, limit = 20):
+    '''
+    Finds the most unisex names of a year for the whole catalog at once, the
+    names closest to half boys and half girls among the names given to at 
+    least min_count babies that year, ties broken by frequency.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+        year: int
+        min_count: int
+              least number of babies given the name that year
+        limit: int
+              number of names returned
+    
+    Return: list of lists [name, boys, girls, boys %]
+    '''
+    matrix, years = count_matrix(records)
+    if year not in years:
+        return []
+    col = int(year - years[0])
+    boys, girls = matrix[0, :, col], matrix[1, :, col]
+    total = boys.astype(np.int64) + girls
+    
+    share = boy_shares(boys, girls)
+    balance = 1 - np.abs(2 * share - 1)       # 1 = half and half, 0 = one
+    picked = np.flatnonzero((total >= min_count) & (balance > 0))
+    order = np.lexsort((-total[picked], -balance[picked]))
+    
+    return [[records['names'][i], int(boys[i]), int(girls[i]), 
+             round(100 * float(share[i]), 1)] for i in picked[order[:limit]]]
+
+def share_trajectory(records, search):
+    '''
+    Returns the boys and girls frequency and the share of boys for each year 
+    of a name, every spelling found by lookup_name is added together.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+        search: str
+              name to be searched
+    
+    Return: tuple (spellings, rows)
+        spellings: list of str, empty if the name was not found
+        rows: list of lists [year, boys, girls, boys %], years without the 
+              name are left out
+    '''
+    spellings = records['keys'].get(normalize_key(search), [])
+    matrix, years = count_matrix(records)
+    ids = [records['ids'][name] for name in spellings]
+    boys = matrix[0, ids].sum(axis = 0)
+    girls = matrix[1, ids].sum(axis = 0)
+    share = boy_shares(boys, girls)
+    
+    rows = []
+    for i in np.flatnonzero(boys.astype(np.int64) + girls):
+        rows.append([int(years[i]), int(boys[i]), int(girls[i]), 
+                     round(100 * float(share[i]), 1)])
+    return list(spellings), rows
+
+def gender_share(names, max_year):
+    '''
+    Menu of the gender share of the names. Asks the user which report to 
+    print:
+    (a) names that went from mostly boys to mostly girls
+    (b) names that went from mostly girls to mostly boys
+    (c) the most unisex names of a year
+    (d) the share of boys and girls of a name in each year
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        max_year: int
+              latest year
+    
+    Return: NONE
+    '''
+    if len(names.keys()) == 0:
+        print("There are no data")
+        return
+    
+    records = get_records(names)
+    print("(a) Names that went from mostly boys to mostly girls\n"
+          "(b) Names that went from mostly girls to mostly boys\n"
+          "(c) Most unisex names of a year\n"
+          "(d) Share of boys and girls of a name")
+    choice = input("Enter report: ").strip().lower()
+    while choice not in ('a', 'b', 'c', 'd'):
+        choice = input("Enter report: ").strip().lower()
+    
+    crossed = ['name', 'first year', 'boys % first', 'last year', 
+               'boys % last', 'total']
+    version = dataset_version(names)
+    if choice in ('a', 'b'):
+        to_gender = 'Girl' if choice == 'a' else 'Boy'
+        render(crossed, cached_query(version, 'crossover', (to_gender,), 
+                                     lambda: crossover_names(records, 
+                                                             to_gender)))
+    elif choice == 'c':
+        start = first_year(names)
+        prompt = "Enter year (" + str(start) + " to " + str(max_year) + "): "
+        year = input(prompt)
+        while not (year.isdigit() and start <= int(year) <= max_year):
+            year = input(prompt)
+        year = int(year)
+        render(['name', 'boys', 'girls', 'boys %'], 
+               cached_query(version, 'unisex', (year,), 
+                            lambda: unisex_names(records, year)))
+    else:
+        search = ask_name(names)
+        spellings, rows = share_trajectory(records, search)
+        if len(spellings) == 0:
+            print("There were no babies named " + search.capitalize() + 
+                  " born in Alberta between " + str(first_year(names)) + 
+                  " and " + str(max_year))
+            return
+        print("\n" + " / ".join(spellings) + ":")
+        render(['year', 'boys', 'girls', 'boys %'], rows)
+    
+def make_shard(label, names, top_ten, max_year):
+    '''
+    Packs one dataset (one jurisdiction) with its own year range. 
+    
+    Parameters:
+        label: str
+              name of the jurisdiction, e.g. 'Alberta'
+        names: dictionary
+               dictionary of all names
+        top_ten: dictionary of top ten lists
+        max_year: int
+              latest year
+    
+    Return: shard: dictionary with the keys 'label', 'names' (CompactNames),
+            'top_ten', 'first_year' and 'max_year'
+    '''
+    names = compact_names(names)
+    return {'label': label, 'names': names, 'top_ten': top_ten, 
+            'first_year': first_year(names), 'max_year': max_year}
+
+def load_shard(fName, label):
+    '''
+    Loads a spreadsheet (.xlsx), pickled data (.p) or a snapshot (.snap) of 
+    another jurisdiction laid out like the Alberta data, i.e. [rank, name, 
+    frequency, gender, year], as a shard. In case of failure this returns 
+    NONE.
+    
+    Parameters:
+        fName: Name of the file
+        label: str
+              name of the jurisdiction
+    
+    Return: shard: dictionary, see make_shard(label, names, top_ten, max_year)
+    '''
+    data = load_dataset(fName)
+    if data == None:
+        return
+    names, top_ten, max_year = data
+    return make_shard(label, names, top_ten, max_year)
+
+def fan_out(shards, query, *args):
+    '''
+    Runs query(shard, *args) on every shard at the same time in the pool of 
+    processes of shard_pool, so the wait is about as long as the slowest 
+    shard and not the sum of all of them. The queries are plain Python and 
+    would run one at a time in threads. The shards are given to the workers 
+    once when the pool starts, only the arguments and the rows go between 
+    the processes. With one shard or one CPU the queries run here one after 
+    the other. The results come back in the order of the shards.
+    
+    Parameters:
+        shards: list of shards, see make_shard
+        query: function(shard, *args) returning a list of rows, defined at 
+               the top level of the module so the workers can find it
+        args: the other arguments of query
+    
+    Return: list of tuples (label, result of query)
+    '''
+    if len(shards) == 0:
+        return []
+    if len(shards) == 1 or (os.cpu_count() or 1) == 1:
+        return [(shard['label'], query(shard, *args)) for shard in shards]
+    pool = shard_pool(shards)
+    results = pool.map(run_on_shard, range(len(shards)), 
+                       itertools.repeat(query), itertools.repeat(args))
+    return [(shard['label'], rows) for shard, rows in zip(shards, results)]
+
+def shard_pool(shards):
+    '''
+    Returns the pool of processes holding these shards, started with 
+    set_worker_shards. The pool is kept in SHARD_POOL for the next queries 
+    and replaced when the shards (their labels or data) change.
+    
+    Parameters:
+        shards: list of shards, see make_shard
+    
+    Return: ProcessPoolExecutor
+    '''
+    key = tuple((shard['label'], dataset_version(shard['names'])) 
+                for shard in shards)
+    if SHARD_POOL['key'] != key:
+        if SHARD_POOL['pool'] is not None:
+            SHARD_POOL['pool'].shutdown()
+        SHARD_POOL['pool'] = ProcessPoolExecutor(
+            max_workers = min(len(shards), os.cpu_count() or 1), 
+            initializer = set_worker_shards, initargs = (shards,))
+        SHARD_POOL['key'] = key
+    return SHARD_POOL['pool']
+
+def set_worker_shards(shards):
+    '''
+    Runs once in every worker of shard_pool and keeps the shards there.
+    '''
+    SHARD_POOL['shards'] = shards
+
+def run_on_shard(index, query, args):
+    '''
+    Runs in a worker of shard_pool: query on the shard number index.
+    '''
+    return query(SHARD_POOL['shards'][index], *args)
+
+def shard_search(shard, search):
+    '''
+    Query of search_all, returns [year, boys, girls] of every year of the 
+    name (all spellings together) in one shard.
+    '''
+    _, name_data = lookup_name(shard['names'], search)
+    return year_rows(name_years(name_data))
+
+def shard_top_ten(shard, year):
+    '''
+    Query of top_ten_all, returns the top ten [rank, name, frequency, gender]
+    of the year in one shard, girls first, empty if the year is not in it.
+    '''
+    data = shard['top_ten'].get(year, [])
+    return ([row for row in data if row[-1] == 'Girl'] + 
+            [row for row in data if row[-1] == 'Boy'])
+
+def shard_wildcard(shard, search, order, limit):
+    '''
+    Query of wildcard_all, returns the first page of ranked_wildcard in one 
+    shard as [name, total frequency, peak year, frequency in the peak year],
+    made from the yr_dict of the page like name_total and name_peak.
+    '''
+    rows = []
+    for name, yr_dict in wildcard_page(shard['names'], search, order, limit):
+        per_year = {year: sum(freq for _, freq in data) 
+                    for year, data in yr_dict.items()}
+        peak = max(per_year, key = lambda yr: (per_year[yr], yr))
+        rows.append([name, sum(per_year.values()), peak, per_year[peak]])
+    return rows
+
+def search_all(shards, search):
+    '''
+    Searches a name in every shard in parallel and returns the merged rows 
+    [dataset, year, boys, girls].
+    '''
+    return [[label] + row for label, rows in 
+            fan_out(shards, shard_search, search) for row in rows]
+
+def top_ten_all(shards, year):
+    '''
+    Gets the top ten list of a year from every shard in parallel and returns 
+    the merged rows [dataset, rank, name, frequency, gender].
+    '''
+    return [[label] + row for label, rows in 
+            fan_out(shards, shard_top_ten, year) for row in rows]
+
+def wildcard_all(shards, search, order = 'frequency', limit = PAGE_SIZE):
+    '''
+    Runs a wildcard search in every shard in parallel and merges the pages 
+    of each shard into one page of at most limit rows [dataset, name, total,
+    peak year], in the same order as ranked_wildcard (the peak order breaks 
+    ties by the frequency in the peak year).
+    '''
+    results = fan_out(shards, shard_wildcard, search, order, limit)
+    rows = [[label] + row for label, page in results for row in page]
+    if order == 'frequency':
+        rows.sort(key = lambda row: row[2], reverse = True)
+    elif order == 'peak':
+        rows.sort(key = lambda row: (row[3], row[4]), reverse = True)
+    elif order == 'name':
+        rows.sort(key = lambda row: row[1])
+    return [row[:4] for row in rows[:limit]]
+
+def add_shard(shards):
+    '''
+    Asks the user for the name of a jurisdiction and its spreadsheet, 
+    pickled data or snapshot, loads it with load_shard and adds it to the 
+    shards.
+    
+    Parameters:
+        shards: list of shards, see make_shard
+    
+    Return: NONE
+    '''
+    label = input("Enter the name of the jurisdiction: ").strip()
+    while len(label) == 0:
+        label = input("Enter the name of the jurisdiction: ").strip()
+    fName = input("Enter a file name (.xlsx, .p or .snap): ").strip()
+    
+    shard = load_shard(fName, label)
+    if shard == None:
+        print("Could not load " + fName)
+        return
+    # A dataset loaded again under the same name replaces the old one.
+    shards[:] = [old for old in shards if old['label'] != label] + [shard]
+    print("Loaded " + label + " (" + str(shard['first_year']) + " to " + 
+          str(shard['max_year']) + ")")
+
+def query_all(shards):
+    '''
+    Menu of the queries run on all the datasets at once:
+    (a) search for a name
+    (b) top ten list for a year
+    (c) search for names with specific letters
+    
+    Parameters:
+        shards: list of shards, see make_shard
+    
+    Return: NONE
+    '''
+    shards = [shard for shard in shards if len(shard['names']) > 0]
+    if len(shards) == 0:
+        print("There are no data")
+        return
+    
+    print("Datasets: " + ", ".join(shard['label'] + " (" + 
+          str(shard['first_year']) + " to " + str(shard['max_year']) + ")" 
+          for shard in shards))
+    print("(a) Search for a name\n"
+          "(b) Top ten list for a year\n"
+          "(c) Search for names with specific letters")
+    choice = input("Enter query: ").strip().lower()
+    while choice not in ('a', 'b', 'c'):
+        choice = input("Enter query: ").strip().lower()
+    
+    if choice == 'a':
+        search = input("Enter a name: ")
+        render(['dataset', 'year', 'boys', 'girls'], 
+               search_all(shards, search))
+    elif choice == 'b':
+        year = input("Enter year: ")
+        while not year.isdigit():
+            year = input("Enter year: ")
+        render(['dataset', 'rank', 'name', 'frequency', 'gender'], 
+               top_ten_all(shards, int(year)))
+    else:
+        search = input("Enter name with * indicating missing letters: ")
+        render(['dataset', 'name', 'total', 'peak year'], 
+               wildcard_all(shards, search))
+    
+def page_slug(name):
+    '''
+    Returns the file name (without suffix) of the report page of a name. The 
+    normalized key keeps it readable, the short hash keeps spellings with the
+    same key (Mary-Ann, Maryann) apart.
+    
+    Parameters:
+        name: str
+    
+    Return: str, e.g. 'maryann-3f2a9c1e'
+    '''
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+    return (normalize_key(name) or "name") + "-" + digest
+
+def html_page(title, body):
+    '''
+    Returns a whole html page with the title and the body (already html).
+    '''
+    return ("<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\">"
+            "<title>" + html.escape(title) + "</title></head>\n<body>\n"
+            "<h1>" + html.escape(title) + "</h1>\n" + body + 
+            "\n</body>\n</html>\n")
+
+def html_table(columns, rows):
+    '''
+    Returns the rows as an html table with the columns as header.
+    '''
+    parts = ["<table>\n<tr>"]
+    parts.extend("<th>" + html.escape(str(col)) + "</th>" for col in columns)
+    parts.append("</tr>\n")
+    for row in rows:
+        parts.append("<tr>")
+        parts.extend("<td>" + html.escape(str(value)) + "</td>" 
+                     for value in row)
+        parts.append("</tr>\n")
+    parts.append("</table>")
+    return "".join(parts)
+
+def report_tasks(names, top_ten, fmt = 'html', charts = True):
+    '''
+    Goes once over the data and yields one task per page of the report: 
+    the index, one page per year with the top ten list, one page per name
+    with its trend (and chart) and the diversity of the names per year. A 
+    task is (file name, digest, page) where the digest changes only if what
+    is shown on the page changes.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        top_ten: dictionary of top ten lists
+        fmt: str
+             'html' or 'text'
+        charts: bool
+              whether the name pages have a trend chart
+    
+    Return: generator of tuples (file name, digest, page)
+    '''
+    suffix = ".html" if fmt == 'html' else ".txt"
+    records = get_records(names)
+    matrix, years = count_matrix(records)
+    year_list = years.tolist()
+    
+    def task(file_name, page):
+        digest = hashlib.sha1(repr((REPORT_VERSION, fmt, charts, page))
+                              .encode('utf-8')).hexdigest()
+        return file_name, digest, page
+    
+    for year in sorted(top_ten):
+        data = top_ten[year]
+        rows = ([[year] + row for row in data if row[-1] == 'Girl'] + 
+                [[year] + row for row in data if row[-1] == 'Boy'])
+        yield task("year-" + str(year) + suffix, ('year', fmt, year, rows))
+    
+    boys_all, girls_all = matrix[0].tolist(), matrix[1].tolist()
+    index = []
+    for i, name in enumerate(records['names']):
+        slug = page_slug(name)
+        index.append([name, slug + suffix])
+        page = ('name', fmt, charts, name, slug, year_list, boys_all[i], 
+                girls_all[i])
+        yield task(slug + suffix, page)
+    
+    yield task("diversity" + suffix, ('diversity', fmt, name_diversity(names)))
+    yield task("index" + suffix, ('index', fmt, sorted(top_ten), index))
+
+def render_report_page(out_dir, file_name, page):
+    '''
+    Writes one page of the report, runs in the worker processes of 
+    generate_report. Name pages with charts also write the chart as a .png 
+    file next to the page.
+    
+    Parameters:
+        out_dir: str
+              folder of the report
+        file_name: str
+              file name of the page
+        page: tuple made by report_tasks
+    
+    Return: file_name
+    '''
+    kind, fmt = page[0], page[1]
+    suffix = ".html" if fmt == 'html' else ".txt"
+    buf = io.StringIO()
+    
+    if kind == 'year':
+        year, rows = page[2], page[3]
+        if fmt == 'html':
+            title = "Top 10 names in Alberta in " + str(year)
+            body = html_table(TOP_TEN_COLUMNS, rows)
+            buf.write(html_page(title, body))
+        else:
+            top_ten_layout(buf, rows)
+    elif kind == 'name':
+        charts, name, slug, years, boys, girls = page[2:]
+        rows = [[name, yr, b, g] for yr, b, g in zip(years, boys, girls) 
+                if b or g]
+        if charts:
+            fig = Figure(figsize = (8, 5))
+            FigureCanvasAgg(fig)
+            draw_trend(fig.add_subplot(1, 1, 1), np.array(years), 
+                       np.array(boys), np.array(girls), name)
+            fig.savefig(os.path.join(out_dir, slug + ".png"))
+        if fmt == 'html':
+            body = html_table(TREND_COLUMNS[1:], [row[1:] for row in rows])
+            if charts:
+                body = ("<img src=\"" + slug + ".png\" alt=\"Trend for the "
+                        "name " + html.escape(name) + "\">\n" + body)
+            buf.write(html_page(name, body))
+        else:
+            search_layout(buf, rows)
+    elif kind == 'diversity':
+        if fmt == 'html':
+            buf.write(html_page("Diversity of the names", 
+                                html_table(DIVERSITY_COLUMNS, page[2])))
+        else:
+            render(DIVERSITY_COLUMNS, page[2], 'table', buf)
+    else:
+        year_list, index = page[2], page[3]
+        if fmt == 'html':
+            body = ("<h2>Top 10 lists</h2>\n<ul>\n" + "".join(
+                "<li><a href=\"year-" + str(year) + suffix + "\">" + 
+                str(year) + "</a></li>\n" for year in year_list) + 
+                "</ul>\n<p><a href=\"diversity" + suffix + "\">Diversity of "
+                "the names</a></p>\n<h2>Names</h2>\n<ul>\n" + "".join(
+                "<li><a href=\"" + html.escape(link) + "\">" + 
+                html.escape(name) + "</a></li>\n" for name, link in index) + 
+                "</ul>")
+            buf.write(html_page("Alberta Baby names", body))
+        else:
+            buf.writelines("year-" + str(year) + suffix + "\n" 
+                           for year in year_list)
+            buf.write("diversity" + suffix + "\n")
+            buf.writelines(name + "\t" + link + "\n" for name, link in index)
+    
+    with open(os.path.join(out_dir, file_name), "w", 
+              encoding = 'utf-8') as page_file:
+        page_file.write(buf.getvalue())
+    return file_name
+
+def report_files(file_name, page):
+    '''
+    Returns the files written for a page of the report by 
+    render_report_page: the page itself, and the chart of a name page with
+    charts.
+    
+    Parameters:
+        file_name: str
+              file name of the page
+        page: tuple made by report_tasks
+    
+    Return: list of str
+    '''
+    if page[0] == 'name' and page[2]:
+        return [file_name, page[4] + ".png"]
+    return [file_name]
+
+def remove_old_pages(out_dir, old_pages, new_manifest, manifest_name):
+    '''
+    Deletes the pages of an earlier run of generate_report that are not in 
+    the report any more, e.g. names missing from newer data, with their 
+    charts. A chart is kept while a page of the other format (another 
+    manifest in out_dir) still uses it.
+    
+    Parameters:
+        out_dir: str
+              folder of the report
+        old_pages: set of str, file names of the pages to delete
+        new_manifest: dictionary, pages of this run
+        manifest_name: str, path of the manifest of this run
+    
+    Return: NONE
+    '''
+    used = {os.path.splitext(page)[0] for page in new_manifest}
+    for other in os.listdir(out_dir):
+        path = os.path.join(out_dir, other)
+        if other.startswith("manifest-") and other.endswith(".json") and \
+           path != manifest_name:
+            try:
+                with open(path, encoding = 'utf-8') as manifest_file:
+                    used.update(os.path.splitext(page)[0] 
+                                for page in json.load(manifest_file))
+            except (OSError, ValueError):
+                pass
+    
+    for page in old_pages:
+        stem = os.path.splitext(page)[0]
+        files = [page] if stem in used else [page, stem + ".png"]
+        for old_file in files:
+            try:
+                os.remove(os.path.join(out_dir, old_file))
+            except OSError:
+                pass
+
+def generate_report(names, top_ten, out_dir = "report", fmt = 'html', 
+                    charts = True, workers = None):
+    '''
+    Builds the static report, a page for every year's top ten list and every
+    name's trend, from one pass over the data (see report_tasks). The pages 
+    are rendered in a pool of processes. The digest of every page is kept in
+    manifest-<fmt>.json in out_dir, a page whose digest did not change since
+    the last run (and whose files, see report_files, are still there) is not
+    rendered again. Pages of the last run that are not in the report any 
+    more are removed (see remove_old_pages).
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        top_ten: dictionary of top ten lists
+        out_dir: str
+              folder of the report, made if missing
+        fmt: str
+             'html' or 'text'
+        charts: bool
+              whether the name pages have a trend chart
+        workers: int
+              number of processes, default is the number of CPUs
+    
+    Return: tuple (number of pages written, number of pages skipped)
+    '''
+    os.makedirs(out_dir, exist_ok = True)
+    manifest_name = os.path.join(out_dir, "manifest-" + fmt + ".json")
+    try:
+        with open(manifest_name, encoding = 'utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        manifest = {}
+    
+    todo, new_manifest = [], {}
+    for file_name, digest, page in report_tasks(names, top_ten, fmt, charts):
+        new_manifest[file_name] = digest
+        if manifest.get(file_name) != digest or \
+           not all(os.path.exists(os.path.join(out_dir, written)) 
+                   for written in report_files(file_name, page)):
+            todo.append((file_name, page))
+    remove_old_pages(out_dir, set(manifest) - set(new_manifest), 
+                     new_manifest, manifest_name)
+    
+    if len(todo) > 0:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            chunk = max(1, len(todo) // (4 * (workers or os.cpu_count() or 1)))
+            list(pool.map(render_report_page, itertools.repeat(out_dir), 
+                          [task[0] for task in todo], 
+                          [task[1] for task in todo], chunksize = chunk))
+    
+    with open(manifest_name, "w", encoding = 'utf-8') as manifest_file:
+        json.dump(new_manifest, manifest_file)
+    return len(todo), len(new_manifest) - len(todo)
+
+def report(names, top_ten):
+    '''
+    Asks the user for the folder and the format of the static report and 
+    calls generate_report(names, top_ten, out_dir, fmt).
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        top_ten: dictionary of top ten lists
+    
+    Return: NONE
+    '''
+    if len(names) == 0:
+        print("There are no data")
+        return
+    
+    out_dir = input("Enter the report folder [report]: ").strip()
+    if len(out_dir) == 0:
+        out_dir = "report"
+    fmt = input("Enter the page format (html, text) [html]: ").strip().lower()
+    while fmt not in ('', 'html', 'text'):
+        fmt = input("Enter the page format (html, text) [html]: ").strip()
+    if len(fmt) == 0:
+        fmt = 'html'
+    
+    written, skipped = generate_report(names, top_ten, out_dir, fmt)
+    print("Report in " + out_dir + ": " + str(written) + " pages written, " + 
+          str(skipped) + " unchanged pages skipped")
+    
+def load_dataset(fName):
+    '''
+    Loads a spreadsheet (.xlsx), pickled data (.p) or a snapshot (.snap) 
+    without asking the user anything. In case of failure this returns NONE.
+    
+    Parameters:
+        fName: Name of the file
+    
+    Return: tuple (names, top_ten, max_year), names is a CompactNames
+    '''
+    if fName.strip()[-2:] == ".p" or fName.strip()[-5:] == ".snap":
+        if fName.strip()[-5:] == ".snap":
+            data = load_snapshot(fName.strip())
+        else:
+            data = load_pickle(fName)
+        if data == None:
+            return
+        names, top_ten, max_year = data
+    else:
+        try:
+            data, max_year = open_file(fName)
+        except:
+            return
+        names = create_names_dict(data, {})
+        top_ten = create_top_ten_dict(data, {})
+    return compact_names(names), top_ten, max_year
+
+def record_ranks(records):
+    '''
+    Returns the rank of every row of the records within its year and gender, 
+    the most frequent name is 1 and names with the same frequency share the 
+    rank (1, 2, 2, 4). The ranks are made once and kept in the records.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+    
+    Return: numpy array of uint32, one rank per row
+    '''
+    if 'rank' not in records:
+        year, gender = records['year'], records['gender']
+        count = records['count'].astype(np.int64)
+        order = np.lexsort((-count, gender, year))
+        y, g, c = year[order], gender[order], count[order]
+        
+        positions = np.arange(len(order))
+        new_group = np.ones(len(order), dtype = bool)
+        new_group[1:] = (y[1:] != y[:-1]) | (g[1:] != g[:-1])
+        new_count = new_group.copy()
+        new_count[1:] |= c[1:] != c[:-1]
+        # Position of the first row of the group and of the same frequency.
+        group_start = np.maximum.accumulate(np.where(new_group, positions, 0))
+        count_start = np.maximum.accumulate(np.where(new_count, positions, 0))
+        
+        ranks = np.empty(len(order), dtype = np.uint32)
+        ranks[order] = count_start - group_start + 1
+        records['rank'] = ranks
+    return records['rank']
+
+def year_blocks(records):
+    '''
+    Splits the rows of the records by year. Returns for every year the row 
+    numbers of that year and the hash of its content: the name, gender and 
+    frequency columns of its rows sorted by name and gender, so two datasets
+    with the same data in a year have the same hash whatever the order of 
+    the rows or the ids of the names. The columns are hashed as bytes, not 
+    as Python tuples. The blocks are made once and kept in the records.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+    
+    Return: dictionary with year as key and tuple (hash, row numbers) as value
+    '''
+    if 'blocks' not in records:
+        blocks = {}
+        names = records['names']
+        # Position of every name id in alphabetical order.
+        position = np.empty(len(names), dtype = np.int64)
+        position[sorted(range(len(names)), key = names.__getitem__)] = \
+            np.arange(len(names))
+        order = np.lexsort((records['gender'], position[records['name']], 
+                            records['year']))
+        year = records['year'][order]
+        bounds = np.flatnonzero(year[1:] != year[:-1]) + 1
+        for rows in np.split(order, bounds):
+            if len(rows) == 0:
+                continue
+            digest = hashlib.sha1("\n".join([names[i] for i in 
+                                             records['name'][rows].tolist()])
+                                  .encode('utf-8'))
+            digest.update(records['gender'][rows].tobytes())
+            digest.update(records['count'][rows].astype('<u4').tobytes())
+            blocks[int(records['year'][rows[0]])] = (digest.hexdigest(), rows)
+        records['blocks'] = blocks
+    return records['blocks']
+
+def block_entries(records, rows):
+    '''
+    Returns the rows of a year block as a dictionary with (name, gender) as 
+    key and (frequency, rank) as value.
+    '''
+    ranks = record_ranks(records)
+    return {(records['names'][i], GENDERS[g]): (c, r) for i, g, c, r in 
+            zip(records['name'][rows].tolist(), 
+                records['gender'][rows].tolist(), 
+                records['count'][rows].tolist(), ranks[rows].tolist())}
+
+def version_blocks(names):
+    '''
+    Returns the year blocks of a loaded version for diff_datasets: for every
+    year the hash of its content (see year_blocks) and a function returning
+    its entries (see block_entries).
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+    
+    Return: dictionary with year as key and tuple (hash, function) as value
+    '''
+    records = get_records(names)
+    return {year: (digest, 
+                   lambda rows = rows: block_entries(records, rows)) 
+            for year, (digest, rows) in year_blocks(records).items()}
+
+def snapshot_blocks(fName):
+    '''
+    Returns the year blocks of a snapshot for diff_datasets like 
+    version_blocks, without loading the snapshot: only its index is read 
+    here and a year is read by snapshot_year when its entries are needed. 
+    The hashes come from the index, NONE for a snapshot saved without them.
+    
+    Parameters:
+        fName: Name of the file
+    
+    Return: dictionary with year as key and tuple (hash, function) as value
+    '''
+    index = read_snapshot_index(fName)
+    
+    def entries(year):
+        names = {}
+        for name, freq, gender in snapshot_year(fName, year, index)['rows']:
+            names.setdefault(name, []).append([freq, gender, year])
+        records = get_records(names)
+        return block_entries(records, np.arange(len(records['year'])))
+    
+    years = set(year for year, _ in index['blocks'])
+    return {year: (index['hashes'].get(year), 
+                   lambda year = year: entries(year)) for year in years}
+
+def diff_datasets(old_blocks, new_blocks):
+    '''
+    Compares two versions of the data by (name, gender, year). The years are 
+    compared by the hash of their block first (see year_blocks) and only the
+    years whose hash differs are compared name by name, so the cost grows 
+    with what changed and not with the size of the data.
+    
+    Parameters:
+        old_blocks: dictionary
+               year blocks of the old version, see version_blocks(names) 
+               and snapshot_blocks(fName)
+        new_blocks: dictionary
+               year blocks of the new version
+    
+    Return: tuple (summary, shifts)
+        summary: list of lists [year, status, added, removed, changed], 
+                 status is 'same', 'changed', 'added' or 'removed'
+        shifts: list of lists [year, gender, name, old rank, new rank, 
+                 shift], names in both versions whose rank moved, the 
+                 largest moves first
+    '''
+    summary, shifts = [], []
+    for year in sorted(set(old_blocks) | set(new_blocks)):
+        old_block, new_block = old_blocks.get(year), new_blocks.get(year)
+        if old_block and new_block and old_block[0] != None and \
+           old_block[0] == new_block[0]:
+            summary.append([year, 'same', 0, 0, 0])
+            continue
+        
+        old = old_block[1]() if old_block else {}
+        new = new_block[1]() if new_block else {}
+        if old_block and new_block and old == new:
+            summary.append([year, 'same', 0, 0, 0])
+            continue
+        changed = 0
+        for key in old.keys() & new.keys():
+            (old_count, old_rank), (new_count, new_rank) = old[key], new[key]
+            if old_count != new_count:
+                changed += 1
+            if old_rank != new_rank:
+                shifts.append([year, key[1], key[0], old_rank, new_rank, 
+                               old_rank - new_rank])
+        status = 'changed' if old_block and new_block else \
+                 ('added' if new_block else 'removed')
+        summary.append([year, status, len(new.keys() - old.keys()), 
+                        len(old.keys() - new.keys()), changed])
+    
+    shifts.sort(key = lambda row: (-abs(row[-1]), row[0], row[2]))
+    return summary, shifts
+
+def load_version(fName):
+    '''
+    Opens one version of the data for compare_versions: a snapshot (.snap) 
+    with snapshot_blocks, so only the years that changed are read, other 
+    files with load_dataset. In case of failure this returns NONE.
+    
+    Parameters:
+        fName: Name of the file
+    
+    Return: dictionary, year blocks for diff_datasets
+    '''
+    if fName[-5:] == ".snap":
+        try:
+            return snapshot_blocks(fName)
+        except SNAPSHOT_ERRORS:
+            return
+    data = load_dataset(fName)
+    if data == None:
+        return
+    return version_blocks(data[0])
+
+def compare_versions():
+    '''
+    Asks the user for the old and the new version of the data (spreadsheets,
+    pickled data or snapshots), prints for every year how many names were added, 
+    removed or changed, and the largest rank changes.
+    
+    Parameters:  None
+    Return:  None
+    '''
+    old_name = input("Enter the old file name (.xlsx, .p or .snap): ").strip()
+    old = load_version(old_name)
+    if old == None:
+        print("Could not load " + old_name)
+        return
+    new_name = input("Enter the new file name (.xlsx, .p or .snap): ").strip()
+    new = load_version(new_name)
+    if new == None:
+        print("Could not load " + new_name)
+        return
+    
+    try:
+        summary, shifts = diff_datasets(old, new)
+    except SNAPSHOT_ERRORS:
+        print("Could not read the snapshots")
+        return
+    render(['year', 'status', 'added', 'removed', 'changed'], summary)
+    if len(shifts) == 0:
+        print("No rank changes")
+        return
+    print("\nLargest rank changes (" + str(len(shifts)) + " in total):")
+    render(['year', 'gender', 'name', 'old rank', 'new rank', 'shift'], 
+           shifts[:PAGE_SIZE])
+    
+def export_mask(records, start = None, end = None, gender = 'both', 
+                pattern = None):
+    '''
+    Returns which rows of the records pass the filters of the export.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+        start, end: int
+              first and last year, None for no limit
+        gender: str
+              'Boy', 'Girl' or 'both'
+        pattern: str
+              name with * indicating missing letters, None for all names
+    
+    Return: numpy array of bool, one per row
+    '''
+    mask = np.ones(len(records['count']), dtype = bool)
+    if start is not None:
+        mask &= records['year'] >= start
+    if end is not None:
+        mask &= records['year'] <= end
+    if gender in GENDERS:
+        mask &= records['gender'] == GENDERS.index(gender)
+    if pattern:
+        matched = np.zeros(len(records['names']), dtype = bool)
+        ids = records['ids']
+        matched[[ids[name] for name in iter_wildcard(CompactNames(records), 
+                                                     pattern)]] = True
+        mask &= matched[records['name']]
+    return mask
+
+def iter_records(names, start = None, end = None, gender = 'both', 
+                 pattern = None):
+    '''
+    Generator of every row of the data passing the filters (see export_mask)
+    as [name, gender, year, frequency, rank], rank within the year and 
+    gender (see record_ranks). The rows are made EXPORT_CHUNK at a time, so 
+    the memory used does not grow with the size of the export.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        start, end, gender, pattern: filters, see export_mask
+    
+    Return: generator of lists
+    '''
+    records = get_records(names)
+    ranks = record_ranks(records)
+    rows = np.flatnonzero(export_mask(records, start, end, gender, pattern))
+    name_list = records['names']
+    for first in range(0, len(rows), EXPORT_CHUNK):
+        chunk = rows[first:first + EXPORT_CHUNK]
+        for i, g, year, freq, rank in zip(records['name'][chunk].tolist(), 
+                                          records['gender'][chunk].tolist(), 
+                                          records['year'][chunk].tolist(), 
+                                          records['count'][chunk].tolist(), 
+                                          ranks[chunk].tolist()):
+            yield [name_list[i], GENDERS[g], year, freq, rank]
+
+def iter_series(names, start = None, end = None, gender = 'both', 
+                pattern = None):
+    '''
+    Generator of the yearly series of every name passing the filters, one 
+    row per name and gender: [name, gender, frequency in each year], with 
+    gender 'both' for boys and girls added together. The years are the 
+    columns of series_columns(names, start, end).
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        start, end, gender, pattern: filters, see export_mask
+    
+    Return: generator of lists
+    '''
+    records = get_records(names)
+    matrix, years = count_matrix(records)
+    if len(years) == 0:
+        return
+    first = 0 if start is None else max(0, start - int(years[0]))
+    last = len(years) if end is None else max(0, end - int(years[0]) + 1)
+    ids = np.arange(len(records['names']))
+    if pattern:
+        ids = np.array([records['ids'][name] for name in 
+                        iter_wildcard(CompactNames(records), pattern)], 
+                       dtype = np.int64)
+    
+    for begin in range(0, len(ids), EXPORT_CHUNK):
+        chunk = ids[begin:begin + EXPORT_CHUNK]
+        if gender == 'both':
+            series = matrix[:, chunk, first:last].sum(axis = 0, 
+                                                      dtype = np.int64)
+            labels = ['both']
+            blocks = [series]
+        else:
+            labels = [gender] if gender in GENDERS else list(GENDERS)
+            blocks = [matrix[GENDERS.index(label), chunk, first:last] 
+                      for label in labels]
+        for label, series in zip(labels, blocks):
+            keep = series.sum(axis = 1) > 0     # names not given that gender
+            for i, row in zip(chunk[keep].tolist(), series[keep].tolist()):
+                yield [records['names'][i], label] + row
+
+def series_columns(names, start = None, end = None):
+    '''
+    Returns the column names of iter_series: name, gender and the years.
+    '''
+    years = count_matrix(get_records(names))[1].tolist()
+    years = [yr for yr in years if (start is None or yr >= start) and 
+             (end is None or yr <= end)]
+    return ['name', 'gender'] + [str(yr) for yr in years]
+
+def write_rows(stream, columns, rows, fmt = 'csv'):
+    '''
+    Writes rows to the stream as CSV (with a header line) or JSON Lines, 
+    EXPORT_CHUNK rows per write, taking the rows from the generator as it 
+    goes.
+    
+    Parameters:
+        stream: file object
+        columns: list of str
+        rows: iterable of lists
+        fmt: str
+             'csv' or 'jsonl'
+    
+    Return: int, number of rows written
+    '''
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream, lineterminator = "\n")
+        writer.writerow(columns)
+        for chunk in iter(lambda: list(itertools.islice(rows, EXPORT_CHUNK)), 
+                          []):
+            writer.writerows(chunk)
+            count += len(chunk)
+    elif fmt == 'jsonl':
+        encode = json.JSONEncoder(default = json_default).encode
+        for chunk in iter(lambda: list(itertools.islice(rows, EXPORT_CHUNK)), 
+                          []):
+            stream.write("".join(encode(dict(zip(columns, row))) + "\n" 
+                                 for row in chunk))
+            count += len(chunk)
+    else:
+        raise ValueError("Unknown export format " + str(fmt))
+    return count
+
+def export_data(names, fName, kind = 'records', start = None, end = None, 
+                gender = 'both', pattern = None):
+    '''
+    Exports the data passing the filters to a CSV file (fName ending with 
+    .csv) or a JSON Lines file (any other suffix, e.g. .jsonl). kind is 
+    'records' for one line per (name, gender, year) from iter_records, or 
+    'series' for one line per name and gender from iter_series.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        fName: Name of the file
+        kind: str
+              'records' or 'series'
+        start, end, gender, pattern: filters, see export_mask
+    
+    Return: int, number of lines written (without the header)
+    '''
+    fmt = 'csv' if fName.lower().endswith(".csv") else 'jsonl'
+    if kind == 'series':
+        columns = series_columns(names, start, end)
+        rows = iter_series(names, start, end, gender, pattern)
+    else:
+        columns = EXPORT_COLUMNS
+        rows = iter_records(names, start, end, gender, pattern)
+    with open(fName, "w", newline = "", encoding = 'utf-8', 
+              buffering = 1024 * 1024) as export_file:
+        return write_rows(export_file, columns, rows, fmt)
+
+def export(names):
+    '''
+    Asks the user for the file, what to export and the filters, and calls 
+    export_data. Pressing enter keeps the default of each question.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+    
+    Return: NONE
+    '''
+    if len(names) == 0:
+        print("There are no data")
+        return
+    
+    fName = input("Enter a file name (.csv or .jsonl) [baby_names.csv]: ")
+    fName = fName.strip() or "baby_names.csv"
+    kind = input("Export records or series [records]: ").strip().lower()
+    while kind not in ('', 'records', 'series'):
+        kind = input("Export records or series [records]: ").strip().lower()
+    
+    years = []
+    for prompt in ("Enter the first year [all]: ", 
+                   "Enter the last year [all]: "):
+        year = input(prompt).strip()
+        while len(year) != 0 and not year.isdigit():
+            year = input(prompt).strip()
+        years.append(int(year) if year else None)
+    
+    gender = input("Enter gender (Boy, Girl, both) [both]: ").strip()
+    while gender.capitalize() not in ('', 'Boy', 'Girl', 'Both'):
+        gender = input("Enter gender (Boy, Girl, both) [both]: ").strip()
+    gender = gender.capitalize() if gender.capitalize() in GENDERS else 'both'
+    pattern = input("Enter names with * indicating missing letters [all]: ")
+    
+    try:
+        count = export_data(names, fName, kind or 'records', years[0], 
+                            years[1], gender, pattern.strip() or None)
+    except OSError:
+        print("Could not write " + fName)
+        return
+    print("Exported " + str(count) + " lines to " + fName)
+
+def forecast_counts(matrix, method = 'smoothing', window = FORECAST_WINDOW, 
+                    alpha = FORECAST_ALPHA):
+    '''
+    Predicts the frequency of the year after the last column of the matrix 
+    for every name and gender at once, from the last window years only.
+    Methods:
+        smoothing: exponential smoothing, every year moves the level alpha
+                   of the way to its frequency
+        trend:     least squares line through the window, continued one 
+                   year (never below zero)
+    
+    Parameters:
+        matrix: numpy array (gender, name, year) of the frequencies, see 
+                count_matrix
+        method: str
+              one of FORECAST_METHODS
+        window: int
+              number of trailing years used
+        alpha: float
+              smoothing factor between 0 and 1
+    
+    Return: numpy array of float (gender, name)
+    '''
+    series = matrix[..., -window:].astype(np.float64)
+    if series.shape[-1] == 0:
+        return np.zeros(matrix.shape[:-1])
+    if method == 'smoothing':
+        level = series[..., 0].copy()
+        for col in range(1, series.shape[-1]):
+            level += alpha * (series[..., col] - level)
+        return level
+    elif method == 'trend':
+        n = series.shape[-1]
+        if n < 2:
+            return series[..., -1]
+        t = np.arange(n) - (n - 1) / 2      # centered, so the mean is 0
+        slope = series @ t / (t @ t)
+        return np.maximum(series.mean(axis = -1) + slope * (n + 1) / 2, 0)
+    raise ValueError("Unknown forecast method " + str(method))
+
+def forecast_ranks(counts):
+    '''
+    Ranks the predicted frequencies within each gender like the workbook, 
+    the most frequent name is 1 and equal frequencies share the rank 
+    (1, 2, 2, 4). Names predicted at zero get rank 0.
+    
+    Parameters:
+        counts: numpy array of int (gender, name)
+    
+    Return: numpy array of int (gender, name)
+    '''
+    ranks = np.zeros(counts.shape, dtype = np.int64)
+    for g in range(counts.shape[0]):
+        ordered = np.sort(-counts[g])
+        ranks[g] = np.searchsorted(ordered, -counts[g], side = 'left') + 1
+    ranks[counts <= 0] = 0
+    return ranks
+
+def forecast_names(names, method = 'smoothing', window = FORECAST_WINDOW, 
+                   alpha = FORECAST_ALPHA):
+    '''
+    Forecasts the next year for every name and gender (see forecast_counts)
+    and ranks the forecasts. The result is cached per dataset version.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        method, window, alpha: see forecast_counts
+    
+    Return: dictionary with the keys
+        year: int, year forecasted
+        counts: numpy array of int (gender, name), predicted frequencies 
+                in the order of the records' names
+        ranks: numpy array of int (gender, name), see forecast_ranks
+    '''
+    records = get_records(names)
+    
+    def query():
+        matrix, years = count_matrix(records)
+        counts = np.rint(forecast_counts(matrix, method, window, 
+                                         alpha)).astype(np.int64)
+        return {'year': int(years[-1]) + 1 if len(years) else None, 
+                'counts': counts, 'ranks': forecast_ranks(counts)}
+    return cached_query(dataset_version(names), 'forecast', 
+                        (method, window, alpha), query)
+
+def forecast_top(names, forecast, n = 10):
+    '''
+    Returns the n names with the highest forecast of each gender as rows 
+    [year, gender, rank, name, forecast].
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        forecast: dictionary, see forecast_names
+        n: int
+    
+    Return: list of lists
+    '''
+    name_list = get_records(names)['names']
+    rows = []
+    for g, gender in enumerate(GENDERS):
+        counts = forecast['counts'][g]
+        top = np.argsort(-counts, kind = 'stable')[:n]
+        for i in top[counts[top] > 0].tolist():
+            rows.append([forecast['year'], gender, 
+                         int(forecast['ranks'][g, i]), name_list[i], 
+                         int(counts[i])])
+    return rows
+
+def backtest_forecast(names, method = 'smoothing', window = FORECAST_WINDOW, 
+                      alpha = FORECAST_ALPHA, holdout = FORECAST_HOLDOUT):
+    '''
+    Scores a forecast method on the last holdout years: each of them is 
+    predicted from the years before it only and compared with the data.
+    Scores, over the names and genders given or predicted that year:
+        mae:    mean absolute error of the frequencies
+        wape %: sum of the absolute errors in percent of the births
+        top 10 %: share of the real top ten (both genders) that was also 
+                  in the predicted top ten
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        method, window, alpha: see forecast_counts
+        holdout: int
+              number of years held out
+    
+    Return: list of lists [year, method, mae, wape %, top 10 %]
+    '''
+    matrix, years = count_matrix(get_records(names))
+    rows = []
+    for col in range(max(1, len(years) - holdout), len(years)):
+        predicted = np.rint(forecast_counts(matrix[..., :col], method, window, 
+                                            alpha))
+        actual = matrix[..., col].astype(np.float64)
+        seen = (actual > 0) | (predicted > 0)
+        errors = np.abs(predicted - actual)[seen]
+        hits = sum(len(np.intersect1d(np.argsort(-actual[g], 
+                                                 kind = 'stable')[:10], 
+                                      np.argsort(-predicted[g], 
+                                                 kind = 'stable')[:10])) 
+                   for g in range(len(GENDERS)))
+        rows.append([int(years[col]), method, 
+                     round(float(errors.mean()), 2) if errors.size else 0.0, 
+                     round(100 * float(errors.sum()) / 
+                           max(float(actual.sum()), 1), 2), 
+                     round(100 * hits / (10 * len(GENDERS)), 1)])
+    return rows
+
+def forecast(names, max_year):
+    '''
+    Menu of the forecasts. Asks the user for the method, prints the names 
+    with the highest forecast for next year and plots a name with its 
+    forecast, or scores both methods on past years.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        max_year: int
+              latest year
+    
+    Return: NONE
+    '''
+    if len(names.keys()) == 0:
+        print("There are no data")
+        return
+    
+    print("(a) Forecast by exponential smoothing\n"
+          "(b) Forecast by linear trend\n"
+          "(c) Score both methods on the last " + str(FORECAST_HOLDOUT) + 
+          " years")
+    choice = input("Enter method: ").strip().lower()
+    while choice not in ('a', 'b', 'c'):
+        choice = input("Enter method: ").strip().lower()
+    
+    if choice == 'c':
+        rows = []
+        for method in FORECAST_METHODS:
+            rows.extend(backtest_forecast(names, method))
+        render(['year', 'method', 'mae', 'wape %', 'top 10 %'], rows)
+        return
+    
+    method = FORECAST_METHODS[ord(choice) - ord('a')]
+    render(['year', 'gender', 'rank', 'name', 'forecast'], 
+           forecast_top(names, forecast_names(names, method)))
+    search = ask_name(names, "Enter a name to plot with its forecast "
+                             "(press enter to skip): ")
+    if len(search.strip()) != 0:
+        plot(names, max_year, method, search)
+
+def diversity_stats(records):
+    '''
+    Measures how spread out the names of every year and gender are, in one 
+    pass over all the rows (not only the top ten). For each year and gender:
+        names:     number of distinct names
+        births:    number of babies
+        entropy:   Shannon entropy of the names in bits, higher when the 
+                   babies are spread over more names
+        gini:      Gini coefficient of the frequencies, 0 when every name 
+                   is given equally often, towards 1 when a few names take 
+                   most of the babies
+        top 10 %, top 100 %: share of the babies given the 10 (100) most 
+                   frequent names
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+    
+    Return: list of lists [year, gender, names, births, entropy, gini, 
+            top 10 %, top 100 %] in the order of the years, girls first
+    '''
+    year, gender = records['year'], records['gender']
+    count = records['count'].astype(np.float64)
+    if len(count) == 0:
+        return []
+    order = np.lexsort((-count, gender, year))
+    y, g, c = year[order], gender[order], count[order]
+    
+    new_group = np.ones(len(order), dtype = bool)
+    new_group[1:] = (y[1:] != y[:-1]) | (g[1:] != g[:-1])
+    group = np.cumsum(new_group) - 1
+    starts = np.flatnonzero(new_group)
+    position = np.arange(len(order)) - starts[group]   # 0 is the most frequent
+    
+    distinct = np.bincount(group)
+    births = np.bincount(group, weights = c)
+    share = c / births[group]
+    entropy = -np.bincount(group, weights = share * np.log2(share))
+    # Gini from the frequencies in increasing order, i = 1 for the smallest.
+    ascending = distinct[group] - position
+    gini = (2 * np.bincount(group, weights = ascending * c) / 
+            (distinct * births) - (distinct + 1) / distinct)
+    top10 = np.bincount(group, weights = c * (position < 10)) / births
+    top100 = np.bincount(group, weights = c * (position < 100)) / births
+    
+    rows = []
+    for i, first in enumerate(starts.tolist()):
+        rows.append([int(y[first]), GENDERS[g[first]], int(distinct[i]), 
+                     int(births[i]), round(float(entropy[i]), 3), 
+                     round(float(gini[i]), 3), round(100 * float(top10[i]), 1),
+                     round(100 * float(top100[i]), 1)])
+    # Girls first in each year, like the top ten lists.
+    rows.sort(key = lambda row: (row[0], row[1] != 'Girl'))
+    return rows
+
+def name_diversity(names):
+    '''
+    Returns diversity_stats of the data, cached per dataset version.
+    '''
+    records = get_records(names)
+    return cached_query(dataset_version(names), 'diversity', (), 
+                        lambda: diversity_stats(records))
+
+def diversity(names):
+    '''
+    Prints the diversity of the names of every year and gender, see 
+    diversity_stats.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+    
+    Return: NONE
+    '''
+    if len(names.keys()) == 0:
+        print("There are no data")
+        return
+    render(DIVERSITY_COLUMNS, name_diversity(names))
+
+def phonetic_key(key):
+    '''
+    Returns the Soundex code of a normalized name (see normalize_key): the 
+    first letter and the codes of the next consonants, so names that sound 
+    alike get the same code. Names not starting with a letter keep the key.
+    Ex: 'mohammad', 'muhammad', 'mohammed' -> 'm530'
+    
+    Parameters:
+        key: str
+    
+    Return: str
+    '''
+    if len(key) == 0 or not ('a' <= key[0] <= 'z'):
+        return key
+    code, last = key[0], SOUNDEX_CODES.get(key[0], '')
+    for char in key[1:]:
+        digit = SOUNDEX_CODES.get(char, '')
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in 'hw':    # h and w do not split the same codes
+            last = digit
+    return code.ljust(4, '0')
+
+def within_distance(a, b, limit):
+    '''
+    Returns whether the edit distance (insertions, deletions and changes of 
+    one letter) between a and b is at most limit. Only the band of the 
+    table within limit of the diagonal is filled, and it stops as soon as 
+    the whole band is over the limit.
+    
+    Parameters:
+        a, b: str
+        limit: int
+    
+    Return: bool
+    '''
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if limit == 0:
+        return a == b
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i if i <= limit else over] + [over] * len(b)
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, 
+                             previous[j - 1] + (a[i - 1] != b[j - 1]), over)
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+def variant_limit(a, b):
+    '''
+    Returns the largest edit distance between two spellings of the same 
+    name, it grows with the length of the shorter one (see VARIANT_LIMITS).
+    '''
+    shorter = min(len(a), len(b))
+    return max([limit for length, limit in VARIANT_LIMITS 
+                if shorter >= length] + [0])
+
+def variant_groups(records):
+    '''
+    Groups the spellings of the same name, e.g. Mohammad, Muhammad and 
+    Mohammed. The normalized keys (see normalize_key) are split into blocks 
+    by phonetic_key, within a block two keys are joined when they are 
+    within variant_limit edits of each other and are mostly given to the 
+    same gender, and the joined keys are merged with union-find. Only keys 
+    in the same block are compared, never all pairs. The groups are made 
+    once and kept in the records.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+    
+    Return: dictionary with the keys
+        group: numpy array of int, the group of every name id
+        members: list of lists of name ids, the spellings of each group, 
+                 the most frequent first
+    '''
+    if 'variants' not in records:
+        keys = list(records['keys'])
+        key_of = np.empty(len(records['names']), dtype = np.int64)
+        for i, key in enumerate(keys):
+            key_of[[records['ids'][name] for name in records['keys'][key]]] = i
+        boys = records['gender'] == 0
+        id_totals = np.bincount(records['name'], weights = records['count'], 
+                                minlength = len(key_of))
+        key_boys = np.bincount(key_of[records['name'][boys]], 
+                               weights = records['count'][boys], 
+                               minlength = len(keys)).tolist()
+        key_total = np.bincount(key_of, weights = id_totals, 
+                                minlength = len(keys)).tolist()
+        
+        parent = list(range(len(keys)))
+        def find(i):
+            root = i
+            while parent[root] != root:
+                root = parent[root]
+            while parent[i] != root:        # path compression
+                parent[i], i = root, parent[i]
+            return root
+        
+        blocks = {}
+        for i, key in enumerate(keys):
+            blocks.setdefault(phonetic_key(key), []).append(i)
+        for block in blocks.values():
+            block.sort(key = lambda i: len(keys[i]))
+            for n, i in enumerate(block):
+                boys_i = 2 * key_boys[i] > key_total[i]
+                for j in block[n + 1:]:
+                    limit = variant_limit(keys[i], keys[j])
+                    if len(keys[j]) - len(keys[i]) > limit:
+                        break       # sorted by length, the rest are longer
+                    if (2 * key_boys[j] > key_total[j]) == boys_i and \
+                       find(i) != find(j) and \
+                       within_distance(keys[i], keys[j], limit):
+                        parent[find(i)] = find(j)
+        
+        group = np.empty(len(records['names']), dtype = np.int64)
+        members = {}
+        for i, key in enumerate(keys):
+            for name in records['keys'][key]:
+                members.setdefault(find(i), []).append(records['ids'][name])
+        member_list = []
+        for number, ids in enumerate(members.values()):
+            ids.sort(key = lambda i: (-id_totals[i], records['names'][i]))
+            group[ids] = number
+            member_list.append(ids)
+        records['variants'] = {'group': group, 'members': member_list}
+    return records['variants']
+
+def variant_spellings(records, spellings):
+    '''
+    Returns the spellings together with every other spelling of their 
+    groups (see variant_groups), the most frequent first.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+        spellings: list of str
+    
+    Return: list of str
+    '''
+    variants = variant_groups(records)
+    groups = sorted({int(variants['group'][records['ids'][name]]) 
+                     for name in spellings})
+    return [records['names'][i] for g in groups 
+            for i in variants['members'][g]]
+
+def variant_label(records, variants, g):
+    '''
+    Returns the label of a group of spellings, e.g. 'Muhammad / Mohammad'.
+    '''
+    return " / ".join(records['names'][i] for i in variants['members'][g])
+
+def variant_top_ten(records, year, n = 10):
+    '''
+    Returns the top ten list of a year with the spellings of the same name 
+    added together (see variant_groups), as the rows of print_top_ten 
+    [year, rank, name, frequency, gender] with the girls first. Groups with
+    the same frequency share the rank.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+        year: int
+        n: int
+              number of ranks
+    
+    Return: list of lists
+    '''
+    variants = variant_groups(records)
+    rows_of_year = records['year'] == year
+    n_groups = len(variants['members'])
+    rows = []
+    for g in (1, 0):                        # girls first
+        mask = rows_of_year & (records['gender'] == g)
+        counts = np.bincount(variants['group'][records['name'][mask]], 
+                             weights = records['count'][mask], 
+                             minlength = n_groups).astype(np.int64)
+        order = np.argsort(-counts, kind = 'stable')
+        ordered = counts[order]
+        for position, group in enumerate(order.tolist()):
+            rank = int(np.searchsorted(-ordered, -ordered[position])) + 1
+            if rank > n or ordered[position] == 0:
+                break
+            rows.append([year, rank, variant_label(records, variants, group), 
+                         int(ordered[position]), GENDERS[g]])
+    return rows
+
+def archetype_series(records, start = None, min_total = ARCHETYPE_MIN):
+    '''
+    Returns the yearly series of every name (boys and girls together) from 
+    start to the latest year, each divided by its own peak so names are 
+    compared by the shape of their curve and not by their size. Names with 
+    fewer than min_total babies in those years are left out.
+    
+    Parameters:
+        records: dictionary
+               see build_records(names)
+        start: int
+              first year, default is the first year of the data
+        min_total: int
+    
+    Return: tuple (ids, series, years)
+        ids: numpy array of the name ids kept
+        series: numpy array of float (name, year), peaks are 1
+        years: numpy array of the years of the columns
+    '''
+    matrix, years = count_matrix(records)
+    first = 0
+    if start is not None and len(years) != 0:
+        first = max(0, start - int(years[0]))
+    counts = matrix[:, :, first:].sum(axis = 0, dtype = np.int64)
+    ids = np.flatnonzero(counts.sum(axis = 1) >= max(min_total, 1))
+    series = counts[ids].astype(np.float64)
+    if series.size == 0:
+        # No years or no names left, nothing to divide.
+        return np.arange(0), np.zeros((0, len(years[first:]))), years[first:]
+    series /= series.max(axis = 1, keepdims = True)
+    return ids, series, years[first:]
+
+def nearest_centroid(series, centroids):
+    '''
+    Returns the index of the nearest centroid (squared distance) of every 
+    row of the series, and the squared distance to it.
+    '''
+    distances = ((series ** 2).sum(axis = 1)[:, None] - 
+                 2 * series @ centroids.T + (centroids ** 2).sum(axis = 1))
+    labels = distances.argmin(axis = 1)
+    return labels, np.maximum(distances[np.arange(len(series)), labels], 0)
+
+def mini_batch_kmeans(series, k = ARCHETYPES, batch_size = 1024, 
+                      iterations = 100, seed = 0, restarts = 4):
+    '''
+    Clusters the rows of the series with mini-batch k-means: the centroids 
+    start from greedy k-means++ on a sample, then every iteration assigns 
+    one random batch of rows to its nearest centroids and moves each 
+    centroid towards the mean of its rows with a step that shrinks as the 
+    centroid gets more rows. The cost of an iteration depends on the batch 
+    size, not on the number of rows, so it scales to national catalogs. It 
+    is run restarts times and the centroids closest to the sample are kept.
+    
+    Parameters:
+        series: numpy array of float (row, year)
+        k: int
+              number of clusters, at most the number of rows
+        batch_size: int
+        iterations: int
+        seed: int
+              seed of the random numbers, the same seed gives the same 
+              clusters
+        restarts: int
+    
+    Return: tuple (labels, centroids)
+        labels: numpy array of int, the cluster of every row
+        centroids: numpy array of float (cluster, year)
+    '''
+    rng = np.random.default_rng(seed)
+    k = min(k, len(series))
+    sample = series[rng.choice(len(series), min(len(series), 
+                                                20 * batch_size), 
+                               replace = False)]
+    best, best_cost = None, None
+    for _ in range(restarts):
+        centroids = kmeans_plus_plus(sample, k, rng)
+        seen = np.zeros(k)
+        for _ in range(iterations):
+            batch = series[rng.integers(len(series), 
+                                        size = min(batch_size, len(series)))]
+            labels, _ = nearest_centroid(batch, centroids)
+            sizes = np.bincount(labels, minlength = k)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, batch)
+            seen += sizes
+            moved = sizes > 0
+            centroids[moved] += ((sums[moved] - sizes[moved, None] * 
+                                  centroids[moved]) / seen[moved, None])
+        cost = nearest_centroid(sample, centroids)[1].sum()
+        if best is None or cost < best_cost:
+            best, best_cost = centroids, cost
+    
+    labels = np.concatenate([nearest_centroid(series[i:i + ARCHETYPE_CHUNK], 
+                                              best)[0] 
+                             for i in range(0, len(series), ARCHETYPE_CHUNK)])
+    return labels, best
+
+def kmeans_plus_plus(sample, k, rng):
+    '''
+    Picks k starting centroids among the rows of the sample, far apart from
+    each other: every next centroid is drawn with a chance growing with the 
+    squared distance to the nearest one already picked, out of a few draws 
+    the one lowering the total distance most is kept (greedy k-means++).
+    
+    Parameters:
+        sample: numpy array of float (row, year)
+        k: int
+        rng: numpy random Generator
+    
+    Return: numpy array of float (cluster, year)
+    '''
+    tries = 2 + int(np.log(k))
+    centroids = sample[[rng.integers(len(sample))]]
+    _, closest = nearest_centroid(sample, centroids)
+    for _ in range(1, k):
+        if closest.sum() == 0:
+            picks = rng.integers(len(sample), size = tries)
+        else:
+            picks = rng.choice(len(sample), size = tries, 
+                               p = closest / closest.sum())
+        # Distance of every row to each candidate, keep the best candidate.
+        options = [np.minimum(closest, nearest_centroid(
+            sample, sample[[pick]])[1]) for pick in picks]
+        best = int(np.argmin([option.sum() for option in options]))
+        centroids = np.vstack([centroids, sample[picks[best]]])
+        closest = options[best]
+    return centroids
+
+def archetype_label(centroid, years):
+    '''
+    Describes the shape of a centroid curve: 'steady' when it never falls 
+    below half of its peak, 'rising' or 'falling' when it peaks in the 
+    last or first three years, otherwise 'peaked in <year>'.
+    '''
+    peak = int(centroid.argmax())
+    if centroid.min() >= centroid.max() / 2:
+        return "steady"
+    if peak >= len(centroid) - 3:
+        return "rising"
+    if peak < 3:
+        return "falling"
+    return "peaked in " + str(int(years[peak]))
+
+def name_archetypes(names, k = ARCHETYPES, start = None, 
+                    min_total = ARCHETYPE_MIN, seed = 0, representatives = 5):
+    '''
+    Clusters every name by the shape of its yearly series (see 
+    archetype_series and mini_batch_kmeans) into archetypes like steady 
+    classics, fads or recent risers. The result is cached per dataset 
+    version.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+        k: int
+              number of archetypes
+        start: int
+              first year, default is the first year of the data
+        min_total: int
+              names with fewer babies are left out
+        seed: int
+              see mini_batch_kmeans
+        representatives: int
+              number of names listed per archetype
+    
+    Return: dictionary with the keys
+        names: list of str, the names clustered
+        labels: numpy array of int, the archetype of each of these names
+        centroids: numpy array of float (archetype, year), the average 
+                   curve of each archetype (peak of a name is 1)
+        years: numpy array of the years of the centroids
+        sizes: list of int, number of names of each archetype
+        representatives: list of lists of str, the names nearest to each
+                   centroid, nearest first
+        labels_text: list of str, see archetype_label
+    '''
+    records = get_records(names)
+    
+    def query():
+        ids, series, years = archetype_series(records, start, min_total)
+        if len(ids) == 0:
+            return None
+        labels, centroids = mini_batch_kmeans(series, k, seed = seed)
+        _, distances = nearest_centroid(series, centroids)
+        nearest = []
+        for c in range(len(centroids)):
+            members = np.flatnonzero(labels == c)
+            order = members[np.argsort(distances[members], 
+                                       kind = 'stable')][:representatives]
+            nearest.append([records['names'][i] for i in ids[order]])
+        return {'names': [records['names'][i] for i in ids.tolist()], 
+                'labels': labels, 'centroids': centroids, 'years': years, 
+                'sizes': np.bincount(labels, 
+                                     minlength = len(centroids)).tolist(), 
+                'representatives': nearest, 
+                'labels_text': [archetype_label(c, years) for c in centroids]}
+    return cached_query(dataset_version(names), 'archetypes', 
+                        (k, start, min_total, seed, representatives), query)
+
+def draw_archetypes(ax, result, clusters = None):
+    '''
+    Draws the centroid curves of name_archetypes in the style of the trend
+    graph of display_data (see trend_axes), one line per archetype.
+    
+    Parameters:
+        ax: matplotlib axes
+        result: dictionary, see name_archetypes
+        clusters: list of int, archetypes to draw, default is all
+    
+    Return: NONE
+    '''
+    years = result['years']
+    if clusters is None:
+        clusters = range(len(result['centroids']))
+    trend_axes(ax, list(years), "Archetypes of the names", 
+               "Share of the peak of the name")
+    for c in clusters:
+        ax.plot(years, result['centroids'][c], 
+                label = str(c + 1) + ": " + result['labels_text'][c])
+    ax.legend()
+
+def archetypes(names):
+    '''
+    Asks the user for the number of archetypes, prints them with their 
+    number of names and most representative names, and plots the curves of 
+    the archetypes chosen by the user.
+    
+    Parameters:
+        names: dictionary
+               dictionary of all names
+    
+    Return: NONE
+    '''
+    if len(names.keys()) == 0:
+        print("There are no data")
+        return
+    
+    prompt = "Enter number of archetypes [" + str(ARCHETYPES) + "]: "
+    k = input(prompt).strip()
+    while len(k) != 0 and not (k.isdigit() and int(k) > 0):
+        k = input(prompt).strip()
+    result = name_archetypes(names, int(k) if k else ARCHETYPES)
+    if result is None:
+        print("There are not enough data")
+        return
+    
+    rows = [[c + 1, result['labels_text'][c], result['sizes'][c], 
+             ", ".join(result['representatives'][c])] 
+            for c in range(len(result['centroids']))]
+    render(['archetype', 'shape', 'names', 'representative names'], rows)
+    
+    choice = input("Enter archetypes to plot, e.g. 1,3 (press enter for all, "
+                   "n for none): ").strip().lower()
+    if choice == 'n':
+        return
+    clusters = [int(c) - 1 for c in choice.replace(" ", "").split(",") 
+                if c.isdigit() and 1 <= int(c) <= len(rows)]
+    draw_archetypes(plt.gca(), result, clusters or None)
+    plt.show()
+
+def change_format():
+    '''
+    Asks the user for the output format used by the search, top ten and 
+    wildcard commands and stores it in SETTINGS. Pressing enter keeps the 
+    current format.
+    
+    Parameters:  None
+    Return:  None
+    '''
+    prompt = ("Enter output format (" + ", ".join(OUTPUT_FORMATS) + ") [" + 
+              SETTINGS['format'] + "]: ")
+    fmt = input(prompt).strip().lower()
+    while len(fmt) != 0 and fmt not in OUTPUT_FORMATS:
+        fmt = input(prompt).strip().lower()
+    if len(fmt) != 0:
+        SETTINGS['format'] = fmt
+    print("Output format is " + SETTINGS['format'])
+    
+def change_scale():
+    '''
+    Asks the user whether the search, top ten, wildcard and trend commands 
+    show the number of babies ('count') or babies per 1,000 births of the 
+    same year and gender ('rate'), and stores it in SETTINGS. Pressing enter
+    keeps the current scale.
+    
+    Parameters:  None
+    Return:  None
+    '''
+    prompt = ("Enter scale (" + ", ".join(SCALES) + ") [" + 
+              SETTINGS['scale'] + "]: ")
+    scale = input(prompt).strip().lower()
+    while len(scale) != 0 and scale not in SCALES:
+        scale = input(prompt).strip().lower()
+    if len(scale) != 0:
+        SETTINGS['scale'] = scale
+    print("Scale is " + SETTINGS['scale'])
+    
+def change_variants():
+    '''
+    Asks the user whether the search, top ten and trend commands count the 
+    spellings of a name together (see variant_groups) and stores it in 
+    SETTINGS. Pressing enter keeps the current setting.
+    
+    Parameters:  None
+    Return:  None
+    '''
+    current = 'y' if SETTINGS['variants'] else 'n'
+    prompt = "Group spelling variants (y/n) [" + current + "]: "
+    answer = input(prompt).strip().lower()
+    while answer not in ('', 'y', 'n'):
+        answer = input(prompt).strip().lower()
+    if len(answer) != 0:
+        SETTINGS['variants'] = answer == 'y'
+    print("Spelling variants are " + 
+          ("grouped" if SETTINGS['variants'] else "not grouped"))
     
 def get_choice():
     '''
@@ -1050,11 +4437,11 @@ def get_choice():
     '''
     
     choice = input("\nEnter command: ")
-    # Error checking, number must be between 0 and 6.
+    # Error checking, number must be between 0 and 21.
     while True:
         if len(choice) != 0 and choice.isdigit():
             choice = int(choice)
-            if 0 <= choice <= 7:
+            if 0 <= choice <= 21:
                 return choice
             
         choice = input("Enter command: ")   
@@ -1072,6 +4459,7 @@ def main():
     top_ten = {}
     max_year = int()
     year = int()
+    shards = []         # datasets of the other jurisdictions
     
     while True:
         print("\nAlberta Baby names\n"
@@ -1083,14 +4471,31 @@ def main():
               "(4) Search for a name\n"
               "(5) Print top ten list for a year\n"
               "(6) Search for names with specific letters\n"
-              "(7) Graphically display the trend of a name\n")
+              "(7) Graphically display the trend of a name\n"
+              "(8) Change output format\n"
+              "(9) Show memory usage and cache statistics\n"
+              "(10) Gender share of names\n"
+              "(11) Load the data of another jurisdiction\n"
+              "(12) Query all jurisdictions\n"
+              "(13) Generate the static report\n"
+              "(14) Compare two versions of the data\n"
+              "(15) Serve name completions and charts over HTTP\n"
+              "(16) Export data to CSV or JSON Lines\n"
+              "(17) Forecast next year\n"
+              "(18) Diversity of the names per year\n"
+              "(19) Switch between counts and rates per 1,000 births\n"
+              "(20) Group spelling variants of names\n"
+              "(21) Cluster names into archetypes\n")
         choice = get_choice()
     
         if   choice == 0: break
         elif choice == 1: 
-            data = load_file("Baby_Names_Frequencies.xlsx", names, top_ten)
+            data = load_file("Baby_Names_Frequencies.xlsx", dict(names), 
+                             top_ten)
             if data != None:
                 names, top_ten, max_year = data
+                names = compact_names(names)
+                clear_query_cache()
         elif choice == 2: 
                 data = (names, top_ten, max_year)
                 pickle_helper(data)
@@ -1098,11 +4503,36 @@ def main():
                 data = load_helper()
                 if data != None:
                     names, top_ten, max_year = data
+                    names = compact_names(names)
+                    clear_query_cache()
                 
         elif choice == 4: name_search(names, max_year)
-        elif choice == 5: print_top_ten(top_ten, max_year)
+        elif choice == 5: 
+            print_top_ten(top_ten, max_year, dataset_version(names), 
+                          get_records(names))
         elif choice == 6: wildcard_search(names)
         elif choice == 7: plot(names, max_year)
+        elif choice == 8: change_format()
+        elif choice == 9: 
+            memory_report(names)
+            stats = query_cache_stats()
+            print("Query cache: " + str(stats['hits']) + " hits, " + 
+                  str(stats['misses']) + " misses, " + str(stats['size']) + 
+                  " of " + str(stats['max_size']) + " results kept")
+        elif choice == 10: gender_share(names, max_year)
+        elif choice == 11: add_shard(shards)
+        elif choice == 12: 
+            query_all([make_shard("Alberta", names, top_ten, max_year)] + 
+                      shards)
+        elif choice == 13: report(names, top_ten)
+        elif choice == 14: compare_versions()
+        elif choice == 15: completion_server(names)
+        elif choice == 16: export(names)
+        elif choice == 17: forecast(names, max_year)
+        elif choice == 18: diversity(names)
+        elif choice == 19: change_scale()
+        elif choice == 20: change_variants()
+        elif choice == 21: archetypes(names)
         
     print("Goodbye")
 